@@ -1,3 +1,6 @@
 """acoustic_guitar_emotion_recognition dataset."""
 
-from .acoustic_guitar_emotion_recognition import AcousticGuitarEmotionRecognition
+# Imported as a top-level package by `tfds build` run in this directory, where
+# acoustic_guitar_emotion_recognition_dataset_builder.py imports the builder instead
+if '.' in __name__:
+  from .acoustic_guitar_emotion_recognition import AcousticGuitarEmotionRecognition
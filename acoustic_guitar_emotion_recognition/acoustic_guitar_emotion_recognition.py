@@ -2,13 +2,14 @@
 
 import tensorflow_datasets as tfds
 import numpy as np
-import sys
-from etils import epath
-sys.path.append(str(epath.Path(__file__).parent.parent.resolve()))
-from audiofeature import AudioFeature
 import csv
 from itertools import chain
 
+from .. import datasetutils
+from .. import sampling
+from ..metadata import acoustic_guitar_emotion_recognition as metadata
+from ..metadata.acoustic_guitar_emotion_recognition import EMOTIONAL_INTENSITIES, EMOTIONS, INSTRUMENT_TYPES, MICROPHONE_POSITIONS, MICROPHONE_TYPES, PERFORMERS, PLAYING_TECHNIQUES
+
 # TODO(acoustic_guitar_emotion_recognition): Markdown description  that will appear on the catalog page.
 _DESCRIPTION = """
 Description is **formatted** as markdown.
@@ -31,83 +32,11 @@ _CITATION = """
 }
 """
 
-PERFORMERS = [
-  'LucTur',
-  'DavBen',
-  'OweWin',
-  'ValFui',
-  'AdoLaV',
-  'MatRig',
-  'TomCan',
-  'TizCam',
-  'SteRom',
-  'SimArm',
-  'SamLor',
-  'AleMar',
-  'MasChi',
-  'FilMel',
-  'GioAcq',
-  'TizBol',
-  'SalOli',
-  'FedCer',
-  'CesSam',
-  'AntPao',
-  'DavRos',
-  'FraBen',
-  'GiaFer',
-  'GioDic',
-  'NicCon',
-  'AntDel',
-  'NicLat',
-  'LucFra',
-  'AngLoi',
-  'MarPia',
-]
-
-INSTRUMENT_TYPES = [
-  'classical-guitar',
-  'steelstring-guitar',
-]
-
-EMOTIONS = [
-  'aggressive',
-  'relaxed',
-  'happy',
-  'sad',
-]
-
-EMOTIONAL_INTENSITIES = [
-  '1',
-  '2',
-  '3',
-]
-
-PLAYING_TECHNIQUES = [
-    'fingers',
-    'fingers+harmonics',
-    'pick',
-    'pick+fingers',
-    'pick+hammeron',
-    'pick+tapping',
-]
-
-MICROPHONE_TYPES = [
-  'condenser',
-  'condenser+piezo',
-  'piezo',
-  'piezo+external-condenser'
-]
-
-MICROPHONE_POSITIONS = [
-  'external',
-  'internal',
-  'internal+external',
-]
 
 class AcousticGuitarEmotionRecognition(tfds.core.GeneratorBasedBuilder):
   """DatasetBuilder for acoustic_guitar_emotion_recognition dataset."""
 
-  VERSION = tfds.core.Version('0.6.0')
+  VERSION = tfds.core.Version(metadata.VERSION)
   RELEASE_NOTES = {
       '0.4.0': 'Initial public release.',
       '0.5.0': 'Take file duration into account instead of simply the number of files when grouping performers into splits.',
@@ -116,6 +45,7 @@ class AcousticGuitarEmotionRecognition(tfds.core.GeneratorBasedBuilder):
   MANUAL_DOWNLOAD_INSTRUCTIONS = """
   Dowload data manually
   """
+  BUILDER_CONFIGS = datasetutils.BUILDER_CONFIGS
 
   def _info(self) -> tfds.core.DatasetInfo:
     """Returns the dataset metadata."""
@@ -123,7 +53,7 @@ class AcousticGuitarEmotionRecognition(tfds.core.GeneratorBasedBuilder):
         builder=self,
         description=_DESCRIPTION,
         features=tfds.features.FeaturesDict({
-            'audio': AudioFeature(force_sample_rate=16000, force_channels='mono', dtype=np.float32, normalize=True),
+            **datasetutils.audio_features(self.builder_config, force_sample_rate=16000, force_channels='mono', dtype=np.float32, normalize=True, storage_dtype=np.int16),
             'performer': tfds.features.ClassLabel(names=PERFORMERS),
             'instrument_type': tfds.features.ClassLabel(names=INSTRUMENT_TYPES),
             'emotion': tfds.features.ClassLabel(names=EMOTIONS),
@@ -141,56 +71,30 @@ class AcousticGuitarEmotionRecognition(tfds.core.GeneratorBasedBuilder):
     """Returns SplitGenerators."""
     # TODO(acoustic_guitar_emotion_recognition): Downloads the data and defines the splits
     # path = dl_manager.download_and_extract('https://todo-data-url')
-    zip_path = dl_manager.manual_dir / f'acoustic-guitar-emotion-dataset-v{self.VERSION}.zip'
+    zip_path = dl_manager.manual_dir / f'{metadata.FOLDER}-emotion-dataset-v{self.VERSION}.zip'
     if not zip_path.exists():
       raise AssertionError(
         'Cannot find {}, manual download required'.format(zip_path)
       )
-    extract_path = dl_manager.extract(zip_path)
-    base_dir = extract_path / 'acoustic-guitar'
-    with (base_dir / 'annotations_acoustic-guitar.csv').open() as f:
-      rows = [row for row in csv.DictReader(f)]
+    base_dir = datasetutils.manual_data_dir(dl_manager, zip_path, metadata.FOLDER)
+    with (base_dir / f'annotations_{metadata.FOLDER}.csv').open() as f:
+      rows = datasetutils.AnnotationIndex(csv.DictReader(f))
 
-    return {
-      'fold1': chain(
-        self._generate_examples(base_dir, rows, 1, 37),
-        self._generate_examples(base_dir, rows, 73, 109),
-        self._generate_examples(base_dir, rows, 212, 224),
-      ),
-      'fold2': chain(
-        self._generate_examples(base_dir, rows, 37, 49),
-        self._generate_examples(base_dir, rows, 121, 133),
-        self._generate_examples(base_dir, rows, 200, 212),
-        self._generate_examples(base_dir, rows, 272, 296),
-        self._generate_examples(base_dir, rows, 392, 404),
-      ),
-      'fold3': chain(
-        self._generate_examples(base_dir, rows, 49, 61),
-        self._generate_examples(base_dir, rows, 109, 121),
-        self._generate_examples(base_dir, rows, 160, 188),
-        self._generate_examples(base_dir, rows, 248, 260),
-        self._generate_examples(base_dir, rows, 368, 392),
-      ),
-      'fold4': chain(
-        self._generate_examples(base_dir, rows, 61, 73),
-        self._generate_examples(base_dir, rows, 145, 160),
-        self._generate_examples(base_dir, rows, 188, 200),
-        self._generate_examples(base_dir, rows, 236, 248),
-        self._generate_examples(base_dir, rows, 332, 356),
-      ),
-      'fold5': chain(
-        self._generate_examples(base_dir, rows, 133, 145),
-        self._generate_examples(base_dir, rows, 260, 272),
-        self._generate_examples(base_dir, rows, 296, 332),
-        self._generate_examples(base_dir, rows, 356, 368),
-      ),
+    splits = {
+      fold: chain.from_iterable(self._generate_examples(base_dir, rows.between(start, end)) for start, end in ranges)
+      for fold, ranges in metadata.FOLDS.items()
     }
+    if self.builder_config.balanced_folds:
+      splits = datasetutils.balanced_folds(self._generate_examples(base_dir, rows), len(splits), dl_manager.download_dir)
+    return datasetutils.encode_splits(splits, self.info.features, self.builder_config, self.data_dir)
+
+  def _download_and_prepare(self, dl_manager, download_config):
+    super()._download_and_prepare(dl_manager, download_config)
+    sampling.write_indexes(self.data_dir, self.info)
 
-  def _generate_examples(self, base_dir, metadata_rows, start_id, end_id):
+  def _generate_examples(self, base_dir, metadata_rows):
     """Yields examples."""
-    for row in metadata_rows:
-      file_id = int(row['file_id'])
-      if file_id >= start_id and file_id < end_id:
-        full_path = base_dir / row['emotion'] / (row['file_name'] + '.wav')
-        example = {'audio': full_path, 'performer': row['performer'], 'instrument_type': row['instrument'], 'emotion': row['emotion'], 'emotional_intensity': row['emotional_intensity'], 'playing_technique': row['playing_technique'], 'microphone_type': row['microphone_type'], 'microphone_position': row['microphone_position']}
-        yield file_id, example
+    for file_id, row in metadata_rows:
+      full_path = base_dir / row['emotion'] / (row['file_name'] + '.wav')
+      example = {'audio': full_path, 'performer': row['performer'], 'instrument_type': row['instrument'], 'emotion': row['emotion'], 'emotional_intensity': row['emotional_intensity'], 'playing_technique': row['playing_technique'], 'microphone_type': row['microphone_type'], 'microphone_position': row['microphone_position']}
+      yield file_id, example
@@ -0,0 +1,20 @@
+"""Entry point of `tfds build` run in this directory.
+
+TFDS imports this file without the repository package, where the relative
+imports of the builder module fail. It imports the builder through the
+package instead, with the parent directory of the repository on the path
+only for that import, and subclasses it for TFDS to find it in this module.
+"""
+
+import importlib
+import os
+
+import tensorflow_datasets as tfds
+
+_PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+with tfds.core.utils.add_sys_path(os.path.dirname(_PACKAGE_DIR)):
+  _builder = importlib.import_module(f'{os.path.basename(_PACKAGE_DIR)}.acoustic_guitar_emotion_recognition.acoustic_guitar_emotion_recognition')
+
+
+class AcousticGuitarEmotionRecognition(_builder.AcousticGuitarEmotionRecognition):
+  pass
@@ -1,47 +1,824 @@
-from typing import BinaryIO, Optional, Union
+from concurrent import futures
+import contextlib
+import functools
+import hashlib
+import io
+import math
+import os
+import struct
+import uuid
+import zlib
+try:
+  import fcntl
+except ImportError:
+  # Windows, where the cache directory is scanned on every write instead
+  fcntl = None
+from typing import BinaryIO, NamedTuple, Optional, Sequence, Tuple, Union
 
+from etils import epath
+from tensorflow_datasets.core import decode as decode_lib
 from tensorflow_datasets.core import lazy_imports_lib
 from tensorflow_datasets.core import utils
 from tensorflow_datasets.core.features import feature as feature_lib
 from tensorflow_datasets.core.features import tensor_feature
 from tensorflow_datasets.core.features.audio_feature import Audio
 from tensorflow_datasets.core.utils import type_utils
+from tensorflow_datasets.core.utils.lazy_imports_utils import tensorflow as tf
 import numpy as np
 
+from . import profiling
+
 Encoding = tensor_feature.Encoding
 
+_WAVE_FORMAT_PCM = 0x0001
+_WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+# Same headroom as the default of pydub.effects.normalize
+_NORMALIZE_HEADROOM_DB = 0.1
+# Part of every SampleCache key, bump whenever encode_audio's output changes
+_ENCODE_VERSION = 3
+
+
+# Samples converted at a time where unsigned samples need several operations
+_CONVERT_BLOCK_SAMPLES = 1 << 18
+
+
+def _sample_blocks(np_array, out):
+  """Yields matching blocks of `np_array` and `out` along their first axis."""
+  if np_array.ndim == 0:
+    yield np_array, out
+    return
+  step = max(1, _CONVERT_BLOCK_SAMPLES // max(1, np_array[:1].size))
+  for start in range(0, len(np_array), step):
+    yield np_array[start:start + step], out[start:start + step]
+
 
-def samples_as_dtype(np_array, np_dtype):
+def samples_as_dtype(np_array, np_dtype, out=None):
+  """Converts samples to `np_dtype`, scaling between the integer and float ranges.
+
+  The result is written to `out` if given, which may be of a wider type than
+  `np_dtype`, e.g. int64 holding 16-bit samples. Otherwise an array is only
+  allocated when the dtype changes. Every conversion reads the samples once:
+  signed ones with a single ufunc into `out`, unsigned ones, which are offset
+  as well, a block at a time while it is in cache.
+  """
+  np_dtype = np.dtype(np_dtype)
+  if out is None:
+    if np_array.dtype == np_dtype:
+      return np_array
+    out = np.empty(np_array.shape, np_dtype)
   if np.issubdtype(np_array.dtype, np.integer) and np.issubdtype(np_dtype, np.floating):
     # Convert int to float
     bitdepth = 8 * np_array.dtype.itemsize
     peak_value = 1 << (bitdepth-1)
     if np.issubdtype(np_array.dtype, np.unsignedinteger):
-      return ((np_array - peak_value + 1) / peak_value).astype(np_dtype)
+      for block, out_block in _sample_blocks(np_array, out):
+        np.subtract(block, peak_value - 1, out=out_block, dtype=out.dtype)
+        out_block *= 1 / peak_value
     else:
-      return (np_array / peak_value).astype(np_dtype)
+      # Exact, since the scale is a power of two
+      np.multiply(np_array, 1 / peak_value, out=out, dtype=out.dtype)
   elif np.issubdtype(np_array.dtype, np.floating) and np.issubdtype(np_dtype, np.integer):
     # Convert float to int
     bitdepth = 8 * np_dtype.itemsize
     peak_value = 1 << (bitdepth-1)
     if np.issubdtype(np_dtype, np.unsignedinteger):
-      return ((np_array + 1) * peak_value - 1).astype(np_dtype)
+      # Scaled in floating point, with a temporary of one block only
+      for block, out_block in _sample_blocks(np_array, out):
+        scaled = np.add(block, 1)
+        scaled *= peak_value
+        scaled -= 1
+        np.copyto(out_block, scaled, casting='unsafe')
     else:
-      return (np_array * peak_value).astype(np_dtype)
+      np.multiply(np_array, peak_value, out=out, casting='unsafe')
   else:
     # Convert int to int or float to float
-    return np_array.astype(np_dtype)
+    np.copyto(out, np_array, casting='unsafe')
+  return out
+
+
+# Frames converted to float at a time when downmixing integer samples
+_DOWNMIX_BLOCK_FRAMES = 1 << 14
+
+
+def downmix(
+  samples: np.ndarray,
+  weights: Optional[Sequence[float]] = None,
+  dtype: np.dtype = np.float32,
+  scale: float = 1,
+  out: Optional[np.ndarray] = None,
+) -> np.ndarray:
+  """Mixes a (frames, channels) buffer down to mono in a single pass.
+
+  Without `weights`, every channel contributes equally. The mix is accumulated
+  in floating point `dtype`, so integer input cannot clip or wrap around.
+  `scale` is folded into the weights, e.g. to convert integer samples to
+  [-1, 1) at no extra cost. The result is written to `out` if given.
+  """
+  channels = samples.shape[1]
+  if weights is None:
+    weights = np.full(channels, 1 / channels)
+  else:
+    weights = np.asarray(weights, dtype=np.float64)
+    if weights.shape != (channels,):
+      raise ValueError(f'Expected {channels} channel weights, got {weights.shape[0]}.')
+  weights = (scale * weights).astype(dtype)
+  if out is None:
+    out = np.empty(len(samples), dtype)
+  if samples.dtype == weights.dtype:
+    return np.matmul(samples, weights, out=out)
+  # Integer input is converted a block at a time, instead of copying it whole
+  scratch = np.empty((min(len(samples), _DOWNMIX_BLOCK_FRAMES), channels), dtype)
+  for start in range(0, len(samples), _DOWNMIX_BLOCK_FRAMES):
+    block = samples[start:start + _DOWNMIX_BLOCK_FRAMES]
+    converted = scratch[:len(block)]
+    np.copyto(converted, block, casting='unsafe')
+    np.matmul(converted, weights, out=out[start:start + len(block)])
+  return out
+
+
+def frame_windows(samples: np.ndarray, window: int, hop: int) -> Tuple[np.ndarray, np.ndarray]:
+  """Cuts samples into windows of `window` frames that start every `hop` frames.
+
+  The last window is zero-padded as far as needed to cover the end of the
+  samples, and there is always at least one window. Returns the start offsets
+  and the windows, as a strided view of shape (num_windows, window, ...).
+  """
+  num_windows = 1 + max(0, -(-(len(samples) - window) // hop))
+  padded_length = (num_windows - 1) * hop + window
+  if padded_length > len(samples):
+    padding = np.zeros((padded_length - len(samples),) + samples.shape[1:], dtype=samples.dtype)
+    samples = np.concatenate([samples, padding])
+  windows = np.lib.stride_tricks.sliding_window_view(samples, window, axis=0)[::hop]
+  return np.arange(num_windows) * hop, np.moveaxis(windows, -1, 1)
+
+
+@functools.lru_cache(maxsize=None)
+def _hann_window(frame_length: int) -> np.ndarray:
+  # Periodic, as used for spectral analysis
+  return (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(frame_length) / frame_length)).astype(np.float32)
+
+
+def _hz_to_mel(frequency):
+  return 1127 * np.log1p(np.asarray(frequency) / 700)
+
+
+@functools.lru_cache(maxsize=None)
+def _mel_filterbank(sample_rate: int, fft_length: int, n_mels: int, fmin: float, fmax: float) -> np.ndarray:
+  """Returns the (fft_length // 2 + 1, n_mels) matrix of triangular mel filters.
+
+  Uses the HTK mel scale, like `tf.signal.linear_to_mel_weight_matrix`.
+  """
+  bin_mels = _hz_to_mel(np.linspace(0, sample_rate / 2, fft_length // 2 + 1))[:, np.newaxis]
+  edges = np.linspace(_hz_to_mel(fmin), _hz_to_mel(fmax), n_mels + 2)
+  lower, center, upper = edges[:-2], edges[1:-1], edges[2:]
+  weights = np.minimum((bin_mels - lower) / (center - lower), (upper - bin_mels) / (upper - center))
+  return np.maximum(weights, 0).astype(np.float32)
+
+
+@functools.lru_cache(maxsize=None)
+def _dct_matrix(n_mels: int, n_mfcc: int) -> np.ndarray:
+  # Orthonormal DCT-II, as used for MFCCs
+  dct = np.cos(np.pi / n_mels * (np.arange(n_mels)[:, np.newaxis] + 0.5) * np.arange(n_mfcc))
+  dct *= np.sqrt(2 / n_mels)
+  dct[:, 0] /= np.sqrt(2)
+  return dct.astype(np.float32)
+
+
+def spectral_features(
+  samples: np.ndarray,
+  *,
+  sample_rate: int,
+  frame_length: int,
+  frame_step: int,
+  n_mels: int,
+  n_mfcc: Optional[int] = None,
+  fmin: float = 0,
+  fmax: Optional[float] = None,
+) -> dict:
+  """Computes the log-mel spectrogram and optionally MFCCs of mono samples.
+
+  `samples` can hold a batch of equally long signals in its leading axes. The
+  results have shape (..., frames, n_mels) and (..., frames, n_mfcc), with
+  `1 + (length - frame_length) // frame_step` frames, or a single frame for
+  shorter signals, which are zero-padded.
+  """
+  if samples.shape[-1] < frame_length:
+    samples = np.pad(samples, [(0, 0)] * (samples.ndim - 1) + [(0, frame_length - samples.shape[-1])])
+  fft_length = 1 << (frame_length - 1).bit_length()
+  frames = np.lib.stride_tricks.sliding_window_view(samples, frame_length, axis=-1)[..., ::frame_step, :]
+  spectrum = np.fft.rfft(frames * _hann_window(frame_length), n=fft_length)
+  power = np.square(spectrum.real) + np.square(spectrum.imag)
+  filterbank = _mel_filterbank(sample_rate, fft_length, n_mels, fmin, fmax or sample_rate / 2)
+  log_mel = np.log(power.astype(np.float32) @ filterbank + 1e-6)
+  features = {'log_mel': log_mel}
+  if n_mfcc:
+    features['mfcc'] = log_mel @ _dct_matrix(n_mels, n_mfcc)
+  return features
+
+
+class WavHeader(NamedTuple):
+  channels: int
+  sample_rate: int
+  bitdepth: int
+  num_frames: int
+
+
+def _parse_fmt_chunk(chunk: bytes) -> Optional[Tuple[int, int, int]]:
+  """Returns the channels, sample rate and bit depth of integer PCM formats."""
+  if len(chunk) < 16:
+    return None
+  format_tag, channels, sample_rate, _, block_align, bitdepth = struct.unpack_from('<HHIIHH', chunk)
+  if format_tag == _WAVE_FORMAT_EXTENSIBLE and len(chunk) >= 26:
+    # The actual format tag is the start of the sub-format GUID
+    format_tag, = struct.unpack_from('<H', chunk, 24)
+  if format_tag != _WAVE_FORMAT_PCM or bitdepth not in (8, 16, 24, 32) or block_align != channels * bitdepth // 8:
+    return None
+  return channels, sample_rate, bitdepth
+
+
+def pcm_to_array(pcm: bytes, channels: int, bitdepth: int) -> np.ndarray:
+  """Converts little-endian PCM data into a (frames, channels) array.
+
+  The samples have the same layout as pydub's `get_array_of_samples`: 8-bit
+  audio is made signed and 24-bit audio is widened to 32-bit.
+  """
+  if bitdepth == 8:
+    # Flipping the sign bit turns unsigned into signed samples
+    samples = (np.frombuffer(pcm, dtype=np.uint8) ^ 0x80).view(np.int8)
+  elif bitdepth == 24:
+    samples = np.empty((len(pcm) // 3, 4), dtype=np.uint8)
+    samples[:, 1:] = np.frombuffer(pcm, dtype=np.uint8).reshape(-1, 3)
+    # pydub fills the new low byte with the sign bit
+    samples[:, 0] = np.where(samples[:, 3] > 0x7f, 0xff, 0)
+    samples = samples.view('<i4')
+  else:
+    samples = np.frombuffer(pcm, dtype=f'<i{bitdepth // 8}')
+  return samples.reshape(-1, channels)
+
+
+def read_wav(data: bytes) -> Optional[Tuple[np.ndarray, int]]:
+  """Reads integer PCM WAV data into a (frames, channels) array.
+
+  Returns `None` when the data is not integer PCM WAV, such that callers can
+  fall back to pydub.
+  """
+  if len(data) < 12 or data[:4] != b'RIFF' or data[8:12] != b'WAVE':
+    return None
+  data = memoryview(data)
+  fmt = None
+  pos = 12
+  while pos + 8 <= len(data):
+    chunk_id, chunk_size = struct.unpack_from('<4sI', data, pos)
+    pos += 8
+    if chunk_id == b'fmt ':
+      fmt = _parse_fmt_chunk(data[pos:pos + chunk_size])
+    elif chunk_id == b'data':
+      break
+    pos += chunk_size + (chunk_size & 1)
+  else:
+    return None
+  if fmt is None:
+    return None
+  channels, sample_rate, bitdepth = fmt
+  block_align = channels * bitdepth // 8
+  num_frames = min(chunk_size, len(data) - pos) // block_align
+  return pcm_to_array(data[pos:pos + num_frames * block_align], channels, bitdepth), sample_rate
+
+
+def read_wav_header(fobj: BinaryIO) -> Optional[WavHeader]:
+  """Reads the header of integer PCM WAV data from a file object.
+
+  Reading stops at the start of the sample data, where `fobj` is left. Returns
+  `None` when the data is not integer PCM WAV.
+  """
+  riff = fobj.read(12)
+  if len(riff) < 12 or riff[:4] != b'RIFF' or riff[8:12] != b'WAVE':
+    return None
+  fmt = None
+  while True:
+    chunk_header = fobj.read(8)
+    if len(chunk_header) < 8:
+      return None
+    chunk_id, chunk_size = struct.unpack('<4sI', chunk_header)
+    if chunk_id == b'data':
+      break
+    chunk = fobj.read(chunk_size + (chunk_size & 1))
+    if chunk_id == b'fmt ':
+      fmt = _parse_fmt_chunk(chunk)
+  if fmt is None:
+    return None
+  channels, sample_rate, bitdepth = fmt
+  return WavHeader(channels, sample_rate, bitdepth, chunk_size // (channels * bitdepth // 8))
+
+
+# Layout of `scan_wav_headers` results, one record per file
+WAV_HEADER_DTYPE = np.dtype([('channels', np.int16), ('sample_rate', np.int32), ('bitdepth', np.int16), ('num_frames', np.int64)])
+
+
+def _scan_wav_header(path) -> Tuple[int, int, int, int]:
+  with (path if hasattr(path, 'open') else epath.Path(path)).open('rb') as fobj:
+    header = read_wav_header(fobj)
+  return (0, 0, 0, -1) if header is None else header
+
+
+def scan_wav_headers(paths: Sequence, max_workers: int = 32) -> np.ndarray:
+  """Reads the headers of WAV files into a structured array of WAV_HEADER_DTYPE.
+
+  Only the headers are read, by a pool of threads since this is bound by I/O
+  latency. Files that are not integer PCM WAV get `num_frames` -1.
+  """
+  with futures.ThreadPoolExecutor(max_workers) as pool:
+    return np.array(list(pool.map(_scan_wav_header, paths)), dtype=WAV_HEADER_DTYPE)
+
+
+def _pydub_read(data: bytes, file_format: Optional[str]) -> Tuple[np.ndarray, int]:
+  audio_segment = lazy_imports_lib.lazy_imports.pydub.AudioSegment.from_file(io.BytesIO(data), format=file_format)
+  array = audio_segment.get_array_of_samples()
+  samples = np.frombuffer(array, dtype=np.dtype(array.typecode))
+  return samples.reshape(-1, audio_segment.channels), audio_segment.frame_rate
+
+
+def _scipy_signal():
+  # Going through lazy_imports gives a helpful error if scipy is missing
+  lazy_imports_lib.lazy_imports.scipy
+  from scipy import signal
+  return signal
+
+
+@functools.lru_cache(maxsize=None)
+def _resampling_filter(sample_rate: int, force_sample_rate: int, dtype: np.dtype) -> Tuple[int, int, np.ndarray]:
+  gcd = math.gcd(sample_rate, force_sample_rate)
+  up, down = force_sample_rate // gcd, sample_rate // gcd
+  # Same low-pass filter as scipy.signal.resample_poly designs by default
+  max_rate = max(up, down)
+  h = _scipy_signal().firwin(2 * 10 * max_rate + 1, 1 / max_rate, window=('kaiser', 5.0))
+  return up, down, h.astype(dtype)
+
+
+def resample(samples: np.ndarray, sample_rate: int, force_sample_rate: int) -> np.ndarray:
+  """Resamples a floating point (frames, channels) buffer with polyphase filtering.
+
+  The anti-aliasing filter is designed once per process for every combination
+  of rates and dtype.
+  """
+  up, down, h = _resampling_filter(sample_rate, force_sample_rate, samples.dtype)
+  return _scipy_signal().resample_poly(samples, up, down, axis=0, window=h)
+
+
+class _BlockResampler:
+  """Resamples consecutive blocks of one signal the same way as `resample`.
+
+  Every block is filtered together with enough of its neighbours that the
+  output doesn't depend on where the signal was cut into blocks.
+  """
+
+  def __init__(self, sample_rate: int, force_sample_rate: int, channels: int, dtype: np.dtype):
+    self._up, self._down, self._h = _resampling_filter(sample_rate, force_sample_rate, np.dtype(dtype))
+    # Input frames needed on either side of a block, rounded to a multiple of
+    # down such that block boundaries fall on output samples
+    half_len = (len(self._h) - 1) // 2
+    self._context = -(-(half_len // self._up + 1) // self._down) * self._down
+    # The signal is preceded by zeros, as resample_poly pads implicitly
+    self._buffer = np.zeros((self._context, channels), dtype=dtype)
+
+  def output_length(self, num_frames: int) -> int:
+    return -(-num_frames * self._up // self._down)
+
+  def process(self, block: np.ndarray, final: bool = False) -> np.ndarray:
+    buffer = np.concatenate([self._buffer, block])
+    if final:
+      end = len(buffer)
+    else:
+      # Hold back the frames whose right context hasn't arrived yet
+      end = self._context + (len(buffer) - 2 * self._context) // self._down * self._down
+      if end <= self._context:
+        self._buffer = buffer
+        return buffer[:0]
+    resampled = _scipy_signal().resample_poly(
+      buffer[:end + self._context], self._up, self._down, axis=0, window=self._h
+    )
+    self._buffer = buffer[end - self._context:]
+    start = self._context * self._up // self._down
+    return resampled[start:start + self.output_length(end - self._context)]
+
+
+def _select_channels(samples: np.ndarray, force_channels: Optional[Union[int, str]]) -> np.ndarray:
+  if force_channels == 'first':
+    return samples[:, :1]
+  elif force_channels == 'last':
+    return samples[:, -1:]
+  elif isinstance(force_channels, int) and force_channels < samples.shape[1]:
+    return samples[:, :force_channels]
+  return samples
+
+
+def _to_float(
+  samples: np.ndarray,
+  force_channels: Optional[Union[int, str]],
+  channel_weights: Optional[Sequence[float]],
+  dtype: np.dtype,
+  out: Optional[np.ndarray] = None,
+) -> np.ndarray:
+  if force_channels == 'mono':
+    scale = 1 / (1 << (8 * samples.itemsize - 1))
+    return downmix(samples, channel_weights, dtype, scale, None if out is None else out[:, 0])[:, np.newaxis]
+  return samples_as_dtype(samples, dtype, out)
+
+
+def _normalize(samples: np.ndarray) -> None:
+  if len(samples):
+    samples -= np.ones(len(samples), dtype=samples.dtype) @ samples / len(samples)
+    peak = max(samples.max(), -samples.min())
+    if peak > 0:
+      samples *= 10 ** (-_NORMALIZE_HEADROOM_DB / 20) / peak
+
+
+def quantize(samples: np.ndarray, dtype: type_utils.TfdsDType) -> np.ndarray:
+  """Converts float samples in [-1, 1] to integer PCM of `dtype`, clipping at full scale."""
+  info = np.iinfo(dtype)
+  scaled = samples * np.asarray(-info.min, dtype=samples.dtype)
+  np.rint(scaled, out=scaled)
+  np.clip(scaled, info.min, info.max, out=scaled)
+  return scaled.astype(dtype)
+
+
+def _num_channels(channels: int, force_channels: Optional[Union[int, str]]) -> Tuple[int, int]:
+  """Returns how many of `channels` source channels are decoded, and how many are output."""
+  if force_channels in ('mono', 'first', 'last'):
+    return 1, 1
+  elif isinstance(force_channels, int):
+    return min(force_channels, channels), force_channels
+  return channels, channels
+
+
+def _output_buffers(
+  num_frames: int, channels: int, output_channels: int, dtype: np.dtype, work_dtype: np.dtype, normalize: bool
+) -> Tuple[np.ndarray, np.ndarray]:
+  """Allocates the output samples, and the float buffer for their first `channels`.
+
+  The float buffer is a view into the output when it has the working dtype,
+  unless it would be strided and normalised, whose result depends on layout.
+  """
+  out = np.empty((num_frames, output_channels), dtype)
+  if out.dtype == work_dtype and (channels == output_channels or not normalize):
+    return out, out[:, :channels]
+  return out, np.empty((num_frames, channels), work_dtype)
+
+
+def _finish_output(out: np.ndarray, work: np.ndarray, length: int, normalize: bool, scale_dtype: np.dtype) -> np.ndarray:
+  """Pads the first `length` frames of `work` and writes them to `out`."""
+  work[length:] = 0
+  if normalize:
+    with profiling.stage('normalize', work.nbytes):
+      _normalize(work)
+  channels = work.shape[1]
+  with profiling.stage('output', out.nbytes):
+    if not np.may_share_memory(work, out):
+      samples_as_dtype(work, scale_dtype, out[:, :channels])
+    # repeat channels until requested number of channels reached
+    for channel in range(channels, out.shape[1]):
+      out[:, channel] = out[:, channel % channels]
+  return out[:, 0] if out.shape[1] == 1 else out
+
 
+def encode_audio(
+  data: bytes,
+  file_format: Optional[str] = None,
+  *,
+  force_sample_rate: Optional[int] = None,
+  force_samples: Optional[int] = None,
+  force_channels: Optional[Union[int, str]] = None,
+  channel_weights: Optional[Sequence[float]] = None,
+  normalize: bool = False,
+  dtype: np.dtype = np.dtype(np.int64),
+) -> np.ndarray:
+  """Decodes audio file data into the samples stored by `AudioFeature`."""
+  with profiling.stage('decode', len(data)):
+    decoded = read_wav(data)
+    if decoded is None:
+      decoded = _pydub_read(data, file_format)
+  samples, sample_rate = decoded
+  source_dtype = samples.dtype
+  channels, output_channels = _num_channels(samples.shape[1], force_channels)
 
-def mix_to_mono(audio_segments):
-  def mix_next_segment(downmixed_segment, segments_to_add):
-    if segments_to_add:
-      return mix_next_segment(downmixed_segment.overlay(segments_to_add[0]), segments_to_add[1:])
+  samples = _select_channels(samples, force_channels)
+  # Work in single precision unless more is needed to represent the output
+  work_dtype = np.float32 if dtype == np.float32 else np.float64
+  resampling = force_sample_rate is not None and sample_rate != force_sample_rate
+  if resampling:
+    with profiling.stage('convert', samples.nbytes):
+      samples = _to_float(samples, force_channels, channel_weights, work_dtype)
+    with profiling.stage('resample', samples.nbytes):
+      samples = resample(samples, sample_rate, force_sample_rate)
+  # The output is allocated once at its final shape and everything is written into it
+  out, work = _output_buffers(
+    force_samples or len(samples), channels, output_channels, work_dtype if dtype is None else dtype, work_dtype, normalize
+  )
+  samples = samples[:len(out)]
+  if resampling:
+    with profiling.stage('output', samples.nbytes):
+      work[:len(samples)] = samples
+  else:
+    with profiling.stage('convert', samples.nbytes):
+      _to_float(samples, force_channels, channel_weights, work_dtype, work[:len(samples)])
+  # Integer output keeps the scale of the source samples
+  scale_dtype = source_dtype if np.issubdtype(out.dtype, np.integer) else out.dtype
+  return _finish_output(out, work, len(samples), normalize, scale_dtype)
+
+
+def encode_audio_stream(
+  fobj: BinaryIO,
+  file_format: Optional[str] = None,
+  *,
+  block_frames: int = 1 << 16,
+  force_sample_rate: Optional[int] = None,
+  force_samples: Optional[int] = None,
+  force_channels: Optional[Union[int, str]] = None,
+  channel_weights: Optional[Sequence[float]] = None,
+  normalize: bool = False,
+  dtype: np.dtype = np.dtype(np.float32),
+) -> np.ndarray:
+  """Encodes audio like `encode_audio`, reading it from `fobj` in blocks.
+
+  Integer PCM WAV input is decoded, channel-selected, downmixed and resampled
+  `block_frames` frames at a time straight into the output array, so on top
+  of the returned samples memory use is bounded by the block size.
+  Normalisation takes a second pass over the output. Other formats and
+  integer dtypes are passed on to `encode_audio` as a whole.
+  """
+  options = dict(
+    force_sample_rate=force_sample_rate,
+    force_samples=force_samples,
+    force_channels=force_channels,
+    channel_weights=channel_weights,
+    normalize=normalize,
+    dtype=dtype,
+  )
+  start = fobj.tell()
+  header = read_wav_header(fobj)
+  if header is None or not np.issubdtype(dtype, np.floating):
+    fobj.seek(start)
+    return encode_audio(_read(fobj), file_format, **options)
+  channels = header.channels
+  decoded_channels, output_channels = _num_channels(channels, force_channels)
+  work_dtype = np.float32 if dtype == np.float32 else np.float64
+  num_frames = header.num_frames
+  resampler = None
+  if force_sample_rate is not None and header.sample_rate != force_sample_rate:
+    resampler = _BlockResampler(header.sample_rate, force_sample_rate, decoded_channels, work_dtype)
+    num_frames = resampler.output_length(num_frames)
+
+  out, samples = _output_buffers(force_samples or num_frames, decoded_channels, output_channels, dtype, work_dtype, normalize)
+  block_align = channels * header.bitdepth // 8
+  remaining = header.num_frames * block_align
+  length = 0
+  while length < len(samples):
+    pcm = _read(fobj, min(block_frames * block_align, remaining))
+    remaining -= len(pcm)
+    final = remaining <= 0 or len(pcm) < block_frames * block_align
+    pcm = pcm[:len(pcm) - len(pcm) % block_align]
+    block = _select_channels(pcm_to_array(pcm, channels, header.bitdepth), force_channels)
+    if resampler is None:
+      # Converted straight into the output
+      block = block[:len(samples) - length]
+      with profiling.stage('convert', block.nbytes):
+        _to_float(block, force_channels, channel_weights, work_dtype, samples[length:length + len(block)])
     else:
-      return downmixed_segment
-  gain = lazy_imports_lib.lazy_imports.pydub.utils.ratio_to_db(1 / len(audio_segments))
-  segments = [s.apply_gain(gain) for s in audio_segments]
-  return mix_next_segment(segments[0], segments[1:])
+      with profiling.stage('convert', block.nbytes):
+        block = _to_float(block, force_channels, channel_weights, work_dtype)
+      with profiling.stage('resample', block.nbytes):
+        block = resampler.process(block, final)
+      block = block[:len(samples) - length]
+      samples[length:length + len(block)] = block
+    length += len(block)
+    if final:
+      break
+  if not force_samples:
+    out, samples = out[:length], samples[:length]
+  return _finish_output(out, samples, length, normalize, out.dtype)
+
+
+# Holds the total size of the entries of a SampleCache
+_CACHE_SIZE_NAME = 'size'
+
+
+class SampleCache:
+  """Content-addressed on-disk cache of encoded samples.
+
+  Entries are `.npy` files keyed by a digest of the source file data and the
+  `encode_audio` options, and are memory-mapped when read. Once the entries
+  take up more than `max_bytes`, the least recently used ones are evicted.
+  The total size is shared with other processes using the same directory,
+  such as encode workers, through a file updated under a lock.
+  """
+
+  def __init__(self, directory: str, max_bytes: int = 20 * 1024**3):
+    self._directory = os.fspath(directory)
+    self._max_bytes = max_bytes
+    os.makedirs(self._directory, exist_ok=True)
+    self._add_size(None)
+
+  def __getstate__(self):
+    return self._directory, self._max_bytes
+
+  def __setstate__(self, state):
+    self.__init__(*state)
+
+  @staticmethod
+  def key(digest: str, **options) -> str:
+    """Returns the key for encoding the file with `digest` using `options`."""
+    key = hashlib.blake2b(digest.encode(), digest_size=20)
+    options = dict(options, dtype=np.dtype(options.get('dtype', np.int64)).str)
+    key.update(repr((_ENCODE_VERSION, sorted(options.items()))).encode())
+    return key.hexdigest()
+
+  def load(self, key: str) -> Optional[np.ndarray]:
+    path = os.path.join(self._directory, key + '.npy')
+    try:
+      samples = np.load(path, mmap_mode='r')
+    except (FileNotFoundError, ValueError):
+      return None
+    # The modification time records the last use
+    os.utime(path)
+    return samples
+
+  def save(self, key: str, samples: np.ndarray) -> None:
+    path = os.path.join(self._directory, key + '.npy')
+    # Write to a unique name first, such that readers never see partial entries
+    tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+    with open(tmp_path, 'wb') as f:
+      np.save(f, samples)
+    os.replace(tmp_path, path)
+    self._add_size(os.path.getsize(path))
+
+  def encode(self, data: bytes, file_format: Optional[str] = None, **options) -> np.ndarray:
+    """Returns `encode_audio(data, file_format, **options)`, cached."""
+    key = self.key(file_digest(data), **options)
+    samples = self.load(key)
+    if samples is None:
+      samples = encode_audio(data, file_format, **options)
+      self.save(key, samples)
+    return samples
+
+  @contextlib.contextmanager
+  def _size_file(self):
+    with open(os.path.join(self._directory, _CACHE_SIZE_NAME), 'a+') as f:
+      fcntl.flock(f, fcntl.LOCK_EX)
+      f.seek(0)
+      yield f
+
+  def _add_size(self, nbytes: Optional[int]) -> None:
+    """Adds `nbytes` to the shared size, evicting once it exceeds `max_bytes`, and rescanning with `None`."""
+    if fcntl is None:
+      self._evict()
+      return
+    with self._size_file() as f:
+      size = f.read().strip()
+      # Entries replaced by the same key count twice, which only makes the next eviction scan earlier
+      size = int(size) + nbytes if size and nbytes is not None else None
+      if size is None or size > self._max_bytes:
+        size = self._evict()
+      f.truncate(0)
+      f.write(str(size))
+
+  def _evict(self) -> int:
+    entries = []
+    for entry in os.scandir(self._directory):
+      if entry.name.endswith('.npy'):
+        try:
+          stat = entry.stat()
+        except FileNotFoundError:
+          continue
+        entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+      if total <= self._max_bytes:
+        break
+      try:
+        os.remove(path)
+      except FileNotFoundError:
+        pass
+      total -= size
+    return total
+
+
+def file_digest(data_or_fobj) -> str:
+  """Returns the digest identifying audio file data in a `SampleCache`."""
+  if not hasattr(data_or_fobj, 'read'):
+    return hashlib.blake2b(data_or_fobj, digest_size=20).hexdigest()
+  digest = hashlib.blake2b(digest_size=20)
+  while block := data_or_fobj.read(1 << 20):
+    digest.update(block)
+  return digest.hexdigest()
+
+
+def _read(fobj, size=-1) -> bytes:
+  with profiling.stage('read') as stage:
+    # ZipPath.read() only reads whole members
+    data = fobj.read() if size < 0 else fobj.read(size)
+    if stage is not None:
+      stage.nbytes = len(data)
+  return data
+
+
+def _encode_file_object(fobj, file_format, cache, block_frames, options):
+  if not block_frames:
+    if cache is not None:
+      return cache.encode(_read(fobj), file_format, **options)
+    return encode_audio(_read(fobj), file_format, **options)
+  if cache is None:
+    return encode_audio_stream(fobj, file_format, block_frames=block_frames, **options)
+  # Hash the file in a first pass, such that it's only decoded on a cache miss
+  start = fobj.tell()
+  key = cache.key(file_digest(fobj), **options)
+  samples = cache.load(key)
+  if samples is None:
+    fobj.seek(start)
+    samples = encode_audio_stream(fobj, file_format, block_frames=block_frames, **options)
+    cache.save(key, samples)
+  return samples
+
+
+def encode_audio_file(
+  path_or_fobj,
+  file_format: Optional[str] = None,
+  cache: Optional[SampleCache] = None,
+  block_frames: Optional[int] = None,
+  **kwargs,
+) -> np.ndarray:
+  """Encodes an audio file path or file object like `encode_audio`.
+
+  With `block_frames`, the file is read in blocks by `encode_audio_stream`.
+  With a `cache`, samples are reused whenever the same file data was encoded
+  with the same options before.
+  """
+  if hasattr(path_or_fobj, 'read') and not (block_frames and hasattr(path_or_fobj, 'open')):
+    return _encode_file_object(path_or_fobj, file_format, cache, block_frames, kwargs)
+  path = path_or_fobj if hasattr(path_or_fobj, 'open') else epath.Path(path_or_fobj)
+  with path.open('rb') as fobj:
+    return _encode_file_object(fobj, file_format or path.suffix[1:] or None, cache, block_frames, kwargs)
+
+
+def read_audio_file(path_or_fobj) -> bytes:
+  """Reads the data of an audio file path or file object, for `AudioFeature` with `lazy_decode` to store."""
+  if hasattr(path_or_fobj, 'read'):
+    # ZipPath.read() gives a view of the archive, which is stored as bytes
+    return bytes(_read(path_or_fobj))
+  path = path_or_fobj if hasattr(path_or_fobj, 'open') else epath.Path(path_or_fobj)
+  with path.open('rb') as fobj:
+    return _read(fobj)
+
+
+# FLAC needs a rate in its header, which does not matter for the samples
+_FLAC_DEFAULT_SAMPLE_RATE = 48000
+
+
+def _soundfile():
+  try:
+    import soundfile
+  except ImportError as e:
+    utils.reraise(e, suffix='FLAC storage requires soundfile (`pip install soundfile`).')
+  return soundfile
+
+
+def flac_encode(samples: np.ndarray, sample_rate: Optional[int] = None) -> bytes:
+  """Losslessly compresses int16 samples of shape (frames,) or (frames, channels)."""
+  if not len(samples):
+    # Empty FLAC streams cannot be read back
+    return b''
+  buffer = io.BytesIO()
+  _soundfile().write(
+    buffer, samples, sample_rate or _FLAC_DEFAULT_SAMPLE_RATE, format='FLAC', subtype='PCM_16'
+  )
+  return buffer.getvalue()
+
+
+def flac_decode(data: bytes, dtype: type_utils.TfdsDType = np.int16) -> np.ndarray:
+  """Decodes samples written by `flac_encode`, libsndfile runs without holding the GIL."""
+  if not len(data):
+    return np.zeros(0, dtype)
+  return _soundfile().read(io.BytesIO(data), dtype=np.dtype(dtype).name)[0]
+
+
+@functools.lru_cache(maxsize=None)
+def _decode_pool() -> futures.ThreadPoolExecutor:
+  return futures.ThreadPoolExecutor(os.cpu_count(), thread_name_prefix='audio_decode')
+
+
+def flac_decode_batch(data: Sequence[bytes], dtype: type_utils.TfdsDType = np.int16) -> list:
+  """Decodes a batch of `flac_encode` outputs concurrently in a shared thread pool."""
+  return list(_decode_pool().map(functools.partial(flac_decode, dtype=dtype), data))
+
+
+def _feature_channels(force_channels: Optional[Union[int, str]]) -> Union[int, str]:
+  # Without a channel axis in the shape, only the first channel of multichannel audio fits
+  return 'first' if force_channels is None else force_channels
+
+
+def _audio_shape(num_samples: Optional[int], force_channels: Optional[Union[int, str]]) -> Tuple:
+  if isinstance(force_channels, str) or force_channels is None or force_channels == 1:
+    return (num_samples,)
+  return (num_samples, force_channels)
 
 
 class AudioFeature(Audio):
@@ -57,61 +834,238 @@ class AudioFeature(Audio):
     lazy_decode: bool = False,
     force_channels: Optional[int] = None,
     normalize: bool = False,
+    channel_weights: Optional[Sequence[float]] = None,
+    cache: Optional[SampleCache] = None,
+    block_frames: Optional[int] = None,
+    storage_dtype: Optional[type_utils.TfdsDType] = None,
+    storage_format: Optional[str] = None,
   ):
+    if channel_weights is not None and force_channels != 'mono':
+      raise ValueError('channel_weights can only be used with force_channels=\'mono\'.')
+    if storage_dtype is not None:
+      if lazy_decode or not np.issubdtype(dtype, np.floating) or not np.issubdtype(storage_dtype, np.integer):
+        raise ValueError('storage_dtype must be an integer type and requires a float dtype without lazy_decode.')
+      # Stored as raw integer PCM, because tf.train.Int64List would widen every sample
+      if encoding == Encoding.NONE and storage_format is None:
+        encoding = Encoding.BYTES
+    if storage_format is not None:
+      if storage_format != 'flac' or np.dtype(storage_dtype) != np.int16 or encoding != Encoding.NONE:
+        raise ValueError('storage_format only supports \'flac\', with an int16 storage_dtype and no encoding.')
     self._normalize = normalize
-    if isinstance(force_channels, str) or force_channels is None or force_channels == 1:
-      shape = (shape[0],)
-    else:
-      shape = (shape[0], force_channels)
+    self._force_channels = force_channels
+    self._channel_weights = channel_weights
+    self._cache = cache
+    self._block_frames = block_frames
     super().__init__(
       file_format=file_format,
-      shape=shape,
+      shape=_audio_shape(shape[0], force_channels),
       dtype=dtype,
       sample_rate=force_sample_rate,
       encoding=encoding,
       doc=doc,
-      lazy_decode=lazy_decode,
+      # Audio's lazy decoding ignores the options above, see decode_file_data instead
+      lazy_decode=False,
     )
-    if not lazy_decode:
+    self._lazy_decode = lazy_decode
+    if lazy_decode:
+      self._audio_decoder.encode_audio = self._lazy_encode_audio
+      self._serialized_dtype = np.object_
+      self._serialized_shape = ()
+    else:
       self._audio_decoder.encode_audio = self._eager_encode_audio
+    self._storage_dtype = None if storage_dtype is None else np.dtype(storage_dtype)
+    self._storage_format = storage_format
+    if storage_format == 'flac':
+      self._serialized_dtype = np.object_
+      self._serialized_shape = ()
+    elif storage_dtype is not None:
+      self._serialized_dtype = self._storage_dtype
+
+  @property
+  def encode_options(self) -> dict:
+    """Keyword arguments that make `encode_audio` produce this feature's samples."""
+    return dict(
+      force_sample_rate=self._sample_rate,
+      force_samples=self._shape[0],
+      force_channels=_feature_channels(self._force_channels),
+      channel_weights=self._channel_weights,
+      normalize=self._normalize,
+      dtype=self._dtype,
+    )
+
+  def file_encoder(self, **overrides):
+    """Returns a picklable function mapping a file path or object to the samples to store.
+
+    `overrides` replace entries of `encode_options`, e.g. `force_samples=None`
+    to get the full length of a recording. With `lazy_decode`, the file data
+    is stored as is and `overrides` apply when decoding instead.
+    """
+    if self._lazy_decode:
+      return read_audio_file
+    return functools.partial(
+      encode_audio_file,
+      file_format=self._file_format,
+      cache=self._cache,
+      block_frames=self._block_frames,
+      **{**self.encode_options, **overrides},
+    )
+
+  def encode_example(self, audio_or_path_or_fobj):
+    if self._lazy_decode and isinstance(audio_or_path_or_fobj, bytes):
+      # File data that was read already
+      return tensor_feature.Tensor.encode_example(self, np.array(audio_or_path_or_fobj, dtype=object))
+    if self._storage_dtype is None or not isinstance(audio_or_path_or_fobj, (np.ndarray, list)):
+      return super().encode_example(audio_or_path_or_fobj)
+    # Audio passes arrays through as is, but they have to be converted for storage
+    return tensor_feature.Tensor.encode_example(self, self._to_storage(np.asarray(audio_or_path_or_fobj)))
+
+  def _to_storage(self, samples: np.ndarray) -> np.ndarray:
+    with profiling.stage('store', samples.nbytes):
+      if np.issubdtype(samples.dtype, np.floating):
+        samples = quantize(samples, self._storage_dtype)
+      if self._storage_format == 'flac':
+        return np.array(flac_encode(samples, self._sample_rate), dtype=object)
+      return samples
+
+  def _from_storage(self, samples):
+    return tf.cast(samples, self.tf_dtype) * (1 / -np.iinfo(self._storage_dtype).min)
+
+  def _decode_options(self, overrides: dict) -> Tuple[dict, Tuple]:
+    unknown = overrides.keys() - self.encode_options.keys()
+    if unknown:
+      raise TypeError(f'Unknown options to decode audio with: {sorted(unknown)}')
+    options = {**self.encode_options, **overrides}
+    options['force_channels'] = _feature_channels(options['force_channels'])
+    return options, _audio_shape(options['force_samples'], options['force_channels'])
+
+  def decode_file_data_np(self, data: bytes, **overrides) -> np.ndarray:
+    """Decodes file data stored with `lazy_decode` into the samples eager encoding stores.
+
+    `overrides` replace entries of `encode_options`, e.g. `force_sample_rate`
+    to read at another sample rate than the dataset was built with.
+    """
+    options, _ = self._decode_options(overrides)
+    return encode_audio(data, self._file_format, **options)
+
+  def decode_file_data(self, data: tf.Tensor, **overrides) -> tf.Tensor:
+    """Decodes a tensor of file data like `decode_file_data_np`, in a `tf.numpy_function`."""
+    options, shape = self._decode_options(overrides)
+    decode = functools.partial(encode_audio, file_format=self._file_format, **options)
+    samples = tf.numpy_function(decode, [data], tf.dtypes.as_dtype(options['dtype']), stateful=False)
+    samples.set_shape(shape)
+    return samples
+
+  def decode_file_data_batch(self, data: tf.Tensor, **overrides) -> tf.Tensor:
+    """Decodes a batch of file data like `decode_file_data`, concurrently in a shared thread pool."""
+    options, shape = self._decode_options(overrides)
+    dtype = tf.dtypes.as_dtype(options['dtype'])
+    if None in shape:
+      # Variable lengths cannot be stacked, decode one example at a time
+      return tf.map_fn(functools.partial(self.decode_file_data, **overrides), data, fn_output_signature=dtype)
+    decode = functools.partial(encode_audio, file_format=self._file_format, **options)
+
+    def decode_batch(batch):
+      return np.stack(list(_decode_pool().map(decode, batch)))
+
+    samples = tf.numpy_function(decode_batch, [data], dtype, stateful=False)
+    samples.set_shape((None,) + shape)
+    return samples
+
+  def decode_example(self, tfexample_data):
+    if self._lazy_decode:
+      return self.decode_file_data(tfexample_data)
+    if self._storage_dtype is None:
+      return super().decode_example(tfexample_data)
+    if self._storage_format == 'flac':
+      samples = tf.numpy_function(
+        functools.partial(flac_decode, dtype=self._storage_dtype),
+        [tfexample_data],
+        tf.dtypes.as_dtype(self._storage_dtype),
+        stateful=False,
+      )
+      samples.set_shape(self._shape)
+      return self._from_storage(samples)
+    value, shape = self._get_value_and_shape(tfexample_data)
+    if self._encoding == Encoding.ZLIB:
+      value = tf.io.decode_compressed(value, compression_type='ZLIB')
+    samples = tf.io.decode_raw(value, tf.dtypes.as_dtype(self._storage_dtype))
+    return self._from_storage(tf.reshape(samples, shape))
+
+  def decode_batch_example(self, example_data):
+    if self._lazy_decode:
+      return self.decode_file_data_batch(example_data)
+    if self._storage_format != 'flac':
+      return super().decode_batch_example(example_data)
+    if None in self._shape:
+      # Variable lengths cannot be stacked, decode one example at a time
+      return feature_lib.FeatureConnector.decode_batch_example(self, example_data)
+
+    def decode_batch(data):
+      return np.stack(flac_decode_batch(data, self._storage_dtype))
+
+    samples = tf.numpy_function(decode_batch, [example_data], tf.dtypes.as_dtype(self._storage_dtype), stateful=False)
+    samples.set_shape((None,) + self._shape)
+    return self._from_storage(samples)
+
+  def decode_ragged_example(self, example_data):
+    if self._storage_format != 'flac' and not self._lazy_decode:
+      return super().decode_ragged_example(example_data)
+    return feature_lib.FeatureConnector.decode_ragged_example(self, example_data)
+
+  def decode_example_np(self, example_data):
+    if self._lazy_decode:
+      return self.decode_file_data_np(example_data)
+    if self._storage_dtype is None:
+      return super().decode_example_np(example_data)
+    if self._storage_format == 'flac':
+      samples = flac_decode(example_data, self._storage_dtype).astype(self._dtype)
+    else:
+      value, shape = self._get_value_and_shape(example_data)
+      if self._encoding == Encoding.ZLIB:
+        value = zlib.decompress(value)
+      samples = np.frombuffer(value, self._storage_dtype).reshape(shape).astype(self._dtype)
+    samples *= 1 / -np.iinfo(self._storage_dtype).min
+    return samples
 
   def _eager_encode_audio(
     self, fobj: BinaryIO, file_format: Optional[str]
   ) -> np.ndarray:
-    audio_segment = lazy_imports_lib.lazy_imports.pydub.AudioSegment.from_file(fobj, format=file_format)
-    channels = audio_segment.channels
-
-    force_sample_rate = self._sample_rate
-    force_samples = self._shape[0]
-    force_channels = self._audio_decoder._channels
-
-    if force_channels == 'first':
-      audio_segment = audio_segment.split_to_mono()[0]
-    elif force_channels == 'last':
-      audio_segment = audio_segment.split_to_mono()[-1]
-    elif isinstance(force_channels, int) and force_channels < channels:
-      mono_segments = audio_segment.split_to_mono()[:force_channels]
-      audio_segment = lazy_imports_lib.lazy_imports.pydub.AudioSegment.from_mono_audiosegments(*mono_segments)
-    if force_sample_rate is not None and audio_segment.frame_rate != force_sample_rate:
-      audio_segment = audio_segment.set_frame_rate(force_sample_rate)
-    if force_samples:
-      force_duration_ms = 1000 * force_samples / audio_segment.frame_rate
-      duration_ms = len(audio_segment)
-      if force_duration_ms <= duration_ms:
-        audio_segment = audio_segment[:force_duration_ms]
-      else:
-        silence = lazy_imports_lib.lazy_imports.pydub.AudioSegment.silent(
-          duration=duration_ms-force_duration_ms, frame_rate=audio_segment.frame_rate
-        )
-        audio_segment += silence
-    if force_channels == 'mono':
-      audio_segment = mix_to_mono(audio_segment.split_to_mono())
-    if self._normalize:
-      audio_segment = audio_segment.remove_dc_offset().normalize()
-    samples = np.array([s.get_array_of_samples() for s in audio_segment.split_to_mono()]).T
-    if self._dtype:
-      samples = samples_as_dtype(samples, self._dtype)
-    if isinstance(force_channels, int) and force_channels > channels:
-      # repeat channels until requested number of channels reached
-      samples = np.pad(samples, ((0, 0), (0, force_channels - channels)), mode='wrap')
-    return np.squeeze(samples)
+    samples = encode_audio_file(fobj, file_format, self._cache, self._block_frames, **self.encode_options)
+    return samples if self._storage_dtype is None else self._to_storage(samples)
+
+  def _lazy_encode_audio(
+    self, fobj: BinaryIO, file_format: Optional[str]
+  ) -> np.ndarray:
+    return np.array(_read(fobj), dtype=object)
+
+
+class LazyAudioDecoder(decode_lib.Decoder):
+  """Decodes the audio of an `AudioFeature` with `lazy_decode` using other options.
+
+  Changes how a dataset built with `lazy_decode` is read without rebuilding
+  it, e.g. `as_dataset(decoders={'audio': LazyAudioDecoder(force_sample_rate=8000)})`.
+  Takes the keyword arguments of `AudioFeature.encode_options`.
+  """
+
+  def __init__(self, **overrides):
+    super().__init__()
+    self._overrides = overrides
+
+  def setup(self, *, feature):
+    if not isinstance(feature, AudioFeature) or not feature._lazy_decode:
+      raise ValueError('LazyAudioDecoder can only decode an AudioFeature with lazy_decode=True.')
+    feature._decode_options(self._overrides)
+    super().setup(feature=feature)
+
+  @property
+  def dtype(self):
+    return tf.dtypes.as_dtype(self._overrides.get('dtype', self.feature.np_dtype))
+
+  def decode_example(self, serialized_example):
+    return self.feature.decode_file_data(serialized_example, **self._overrides)
+
+  def decode_batch_example(self, serialized_example):
+    return self.feature.decode_file_data_batch(serialized_example, **self._overrides)
+
+  def decode_example_np(self, serialized_example):
+    return self.feature.decode_file_data_np(serialized_example, **self._overrides)
@@ -0,0 +1,275 @@
+"""Benchmarks audio encoding and full builds on synthetic corpora.
+
+Writes manual-download archives laid out like those of the dataset builders,
+holding WAV files with varied sample rates, bit depths, channel counts and
+durations. Then times sample conversion, downmixing, the per-file encoding of
+`AudioFeature` and complete `download_and_prepare` runs. Every benchmark runs
+in a fresh process, such that its peak RSS can be reported, and the results
+are written as JSON. Nothing is downloaded.
+
+  python -m instrument_emotion_datasets.benchmarks.pipeline [--max-seconds 3] [--configs full window_3s] [--output results.json]
+"""
+
+import argparse
+import csv
+import importlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import timeit
+import wave
+import zipfile
+from concurrent import futures
+
+import numpy as np
+from etils import epath
+
+from .. import datasetutils
+from ..audiofeature import downmix, pcm_to_array, samples_as_dtype
+
+# Number of annotated files, which the builders' fixed folds refer to
+BUILDERS = {
+  'piano_emotion_recognition': 298,
+  'electric_guitar_emotion_recognition': 377,
+  'acoustic_guitar_emotion_recognition': 403,
+}
+SAMPLE_RATES = (16000, 22050, 44100, 48000)
+BITDEPTHS = (8, 16, 24, 32)
+CHANNELS = (1, 2)
+# Consecutive files recorded by the same performer, as in the real annotations
+_FILES_PER_PERFORMER = 12
+
+
+def _metadata(name):
+  return importlib.import_module(f'..metadata.{name}', __package__)
+
+
+def _builder_class(name):
+  module = importlib.import_module(f'..{name}.{name}', __package__)
+  return next(
+    value for value in vars(module).values()
+    if isinstance(value, type) and value.__module__ == module.__name__ and hasattr(value, 'BUILDER_CONFIGS')
+  )
+
+
+def _archive_path(manual_dir, name):
+  """Returns the path of the manual download of builder `name`, and its top-level folder."""
+  module = _metadata(name)
+  return epath.Path(manual_dir) / f'{module.FOLDER}-emotion-dataset-v{module.VERSION}.zip', module.FOLDER
+
+
+def _wav_bytes(samples, sample_rate, bitdepth):
+  """Encodes float samples in [-1, 1) as integer PCM WAV data."""
+  if bitdepth == 8:
+    pcm = np.round(samples * 127 + 128).astype(np.uint8)
+  else:
+    pcm = np.round(samples * ((1 << (bitdepth - 1)) - 1)).astype('<i4' if bitdepth > 16 else '<i2')
+    if bitdepth == 24:
+      pcm = pcm.view(np.uint8).reshape(*pcm.shape, 4)[..., :3]
+  data = io.BytesIO()
+  with wave.open(data, 'wb') as wav:
+    wav.setnchannels(samples.shape[1])
+    wav.setsampwidth(bitdepth // 8)
+    wav.setframerate(sample_rate)
+    wav.writeframes(pcm.tobytes())
+  return data.getvalue()
+
+
+def make_corpus(manual_dir, name, min_seconds, max_seconds, seed=0):
+  """Writes a synthetic manual-download archive for builder `name` into `manual_dir`.
+
+  Returns the number of files, their total size and their total duration.
+  """
+  module = _metadata(name)
+  zip_path, folder = _archive_path(manual_dir, name)
+  num_files = BUILDERS[name]
+  rng = np.random.default_rng(seed)
+  columns = {
+    'performer': module.PERFORMERS,
+    'instrument': module.INSTRUMENT_TYPES,
+    'emotion': module.EMOTIONS,
+    'emotional_intensity': module.EMOTIONAL_INTENSITIES,
+    'playing_technique': getattr(module, 'PLAYING_TECHNIQUES', ['']),
+    'microphone_type': getattr(module, 'MICROPHONE_TYPES', ['']),
+    'microphone_position': getattr(module, 'MICROPHONE_POSITIONS', ['']),
+  }
+  annotations = io.StringIO()
+  writer = csv.DictWriter(annotations, ['file_id', 'file_name', *columns])
+  writer.writeheader()
+  total_bytes = total_seconds = 0
+  with zipfile.ZipFile(zip_path, 'w') as archive:
+    for file_id in range(1, num_files + 1):
+      row = {key: names[(file_id - 1) % len(names)] for key, names in columns.items()}
+      row['performer'] = columns['performer'][(file_id - 1) // _FILES_PER_PERFORMER % len(columns['performer'])]
+      row['file_id'] = file_id
+      row['file_name'] = f'{row["performer"]}_{row["emotion"]}_{file_id:04d}'
+      writer.writerow(row)
+      sample_rate = int(rng.choice(SAMPLE_RATES))
+      seconds = rng.uniform(min_seconds, max_seconds)
+      samples = np.clip(rng.normal(0, 0.2, (int(seconds * sample_rate), int(rng.choice(CHANNELS)))), -1, 0.99)
+      data = _wav_bytes(samples, sample_rate, int(rng.choice(BITDEPTHS)))
+      archive.writestr(f'{folder}/{row["emotion"]}/{row["file_name"]}.wav', data)
+      total_bytes += len(data)
+      total_seconds += len(samples) / sample_rate
+    archive.writestr(f'{folder}/annotations_{folder}.csv', annotations.getvalue())
+  return {'files': num_files, 'bytes': total_bytes, 'seconds': total_seconds}
+
+
+def _peak_rss():
+  # ru_maxrss is in kilobytes on Linux; children are the encode workers
+  return 1024 * max(
+    resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+  )
+
+
+def bench_conversion(function, seconds, channels, sample_rate, repeat):
+  """Times converting random integer PCM of every bit depth to float32."""
+  rng = np.random.default_rng(0)
+  num_frames = int(seconds * sample_rate)
+  results = []
+  for bitdepth in BITDEPTHS:
+    pcm = rng.integers(0, 256, num_frames * channels * bitdepth // 8, dtype=np.uint8).tobytes()
+    samples = pcm_to_array(pcm, channels, bitdepth)
+    if function == 'samples_as_dtype':
+      out = np.empty(samples.shape, np.float32)
+      call = lambda: samples_as_dtype(samples, np.float32, out)
+    else:
+      out = np.empty(len(samples), np.float32)
+      call = lambda: downmix(samples, dtype=np.float32, scale=1 / (1 << (bitdepth - 1)), out=out)
+    elapsed = min(timeit.repeat(call, number=1, repeat=repeat))
+    results.append({
+      'name': function,
+      'bitdepth': bitdepth,
+      'channels': channels,
+      'seconds': elapsed,
+      'mb_per_second': len(pcm) / elapsed / 1e6,
+    })
+  return results
+
+
+def bench_encode(name, config, manual_dir, data_dir):
+  """Times the `AudioFeature.file_encoder` a build uses on every file of a corpus, read beforehand."""
+  builder = _builder_class(name)(data_dir=data_dir, config=config)
+  # Windows are cut from the full length of every recording, as in `encode_splits`
+  overrides = {'force_samples': None} if builder.builder_config.window_seconds else {}
+  encode = builder.info.features['audio'].file_encoder(**overrides)
+  with zipfile.ZipFile(_archive_path(manual_dir, name)[0]) as archive:
+    files = [archive.read(member) for member in archive.namelist() if member.endswith('.wav')]
+  start = time.perf_counter()
+  for data in files:
+    encode(io.BytesIO(data))
+  elapsed = time.perf_counter() - start
+  return [{
+    'name': 'encode',
+    'builder': name,
+    'config': config,
+    'examples': len(files),
+    'seconds': elapsed,
+    'examples_per_second': len(files) / elapsed,
+    'mb_per_second': sum(map(len, files)) / elapsed / 1e6,
+  }]
+
+
+def bench_build(name, config, manual_dir, data_dir, corpus_bytes):
+  """Times a complete `download_and_prepare` of builder `name` into an empty `data_dir`."""
+  import tensorflow_datasets as tfds
+
+  # A build kept in the work directory would be reused without preparing anything
+  shutil.rmtree(data_dir, ignore_errors=True)
+  builder = _builder_class(name)(data_dir=data_dir, config=config)
+  start = time.perf_counter()
+  builder.download_and_prepare(
+    download_config=tfds.download.DownloadConfig(manual_dir=manual_dir, try_download_gcs=False)
+  )
+  elapsed = time.perf_counter() - start
+  examples = sum(split.num_examples for split in builder.info.splits.values())
+  return [{
+    'name': 'download_and_prepare',
+    'builder': name,
+    'config': config,
+    'examples': examples,
+    'seconds': elapsed,
+    'examples_per_second': examples / elapsed,
+    'mb_per_second': corpus_bytes / elapsed / 1e6,
+  }]
+
+
+def _run(function, *args):
+  results = function(*args)
+  peak_rss = _peak_rss()
+  return [{**result, 'peak_rss_bytes': peak_rss} for result in results]
+
+
+def run_isolated(function, *args):
+  """Runs a benchmark in a new process, adding that process' peak RSS to its results."""
+  with futures.ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn')) as executor:
+    return executor.submit(_run, function, *args).result()
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--builders', nargs='+', default=list(BUILDERS), choices=BUILDERS)
+  parser.add_argument('--configs', nargs='+', default=['full'])
+  parser.add_argument('--min-seconds', type=float, default=0.5, help='shortest synthetic recording')
+  parser.add_argument('--max-seconds', type=float, default=3, help='longest synthetic recording')
+  parser.add_argument('--conversion-seconds', type=float, default=30)
+  parser.add_argument('--repeat', type=int, default=10)
+  parser.add_argument('--skip-build', action='store_true', help='only time conversion and encoding')
+  parser.add_argument('--work-dir', help='kept afterwards if given, a temporary directory otherwise')
+  parser.add_argument('--output', help='JSON file to write, stdout otherwise')
+  args = parser.parse_args()
+
+  # Measure the pipeline itself, not the reuse of earlier results
+  os.environ.pop(datasetutils.CACHE_DIR_ENV, None)
+  os.environ[datasetutils.REUSE_PREVIOUS_ENV] = '0'
+  work_dir = epath.Path(args.work_dir or tempfile.mkdtemp(prefix='instrument_emotion_benchmark_'))
+  manual_dir = work_dir / 'manual'
+  manual_dir.mkdir(parents=True, exist_ok=True)
+  try:
+    corpora = {
+      name: make_corpus(manual_dir, name, args.min_seconds, args.max_seconds, seed)
+      for seed, name in enumerate(args.builders)
+    }
+    results = []
+    for function in ('samples_as_dtype', 'downmix'):
+      for channels in CHANNELS:
+        results += run_isolated(bench_conversion, function, args.conversion_seconds, channels, 44100, args.repeat)
+    for name in args.builders:
+      for config in args.configs:
+        data_dir = work_dir / 'data' / f'{name}_{config}'
+        results += run_isolated(bench_encode, name, config, str(manual_dir), str(data_dir))
+        if not args.skip_build:
+          results += run_isolated(bench_build, name, config, str(manual_dir), str(data_dir), corpora[name]['bytes'])
+  finally:
+    if not args.work_dir:
+      shutil.rmtree(work_dir, ignore_errors=True)
+
+  report = {
+    'environment': {
+      'python': platform.python_version(),
+      'numpy': np.__version__,
+      'machine': platform.machine(),
+      'cpu_count': os.cpu_count(),
+      'encode_workers': os.environ.get(datasetutils.ENCODE_WORKERS_ENV),
+    },
+    'corpora': corpora,
+    'results': results,
+  }
+  if args.output:
+    with open(args.output, 'w') as f:
+      json.dump(report, f, indent=2)
+  else:
+    json.dump(report, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,81 @@
+"""Benchmarks integer PCM to float conversion for 8, 16, 24 and 32-bit input.
+
+Compares converting the decoded (frames, channels) buffer with the previous
+divide-then-astype approach against `samples_as_dtype` and `downmix`, with
+and without a preallocated output array. Reports the time per call and the
+peak memory allocated by a call.
+
+  python -m instrument_emotion_datasets.benchmarks.samples_as_dtype [--seconds 30] [--channels 2]
+"""
+
+import argparse
+import timeit
+import tracemalloc
+
+import numpy as np
+
+from ..audiofeature import downmix, pcm_to_array, samples_as_dtype
+
+
+def _divide_then_astype(samples, out):
+  peak_value = 1 << (8 * samples.itemsize - 1)
+  return (samples / peak_value).astype(out.dtype)
+
+
+def _convert(samples, out):
+  return samples_as_dtype(samples, out.dtype)
+
+
+def _convert_into(samples, out):
+  return samples_as_dtype(samples, out.dtype, out)
+
+
+def _downmix(samples, out):
+  return downmix(samples, dtype=out.dtype, scale=1 / (1 << (8 * samples.itemsize - 1)))
+
+
+def _downmix_into(samples, out):
+  return downmix(samples, dtype=out.dtype, scale=1 / (1 << (8 * samples.itemsize - 1)), out=out.reshape(-1)[:len(samples)])
+
+
+METHODS = {
+  'divide+astype': _divide_then_astype,
+  'samples_as_dtype': _convert,
+  'samples_as_dtype(out=)': _convert_into,
+  'downmix': _downmix,
+  'downmix(out=)': _downmix_into,
+}
+
+
+def _peak_allocation(fn, *args):
+  tracemalloc.start()
+  fn(*args)
+  peak = tracemalloc.get_traced_memory()[1]
+  tracemalloc.stop()
+  return peak
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--seconds', type=float, default=30)
+  parser.add_argument('--channels', type=int, default=2)
+  parser.add_argument('--sample-rate', type=int, default=44100)
+  parser.add_argument('--repeat', type=int, default=20)
+  args = parser.parse_args()
+
+  num_frames = int(args.seconds * args.sample_rate)
+  rng = np.random.default_rng(0)
+  print(f'{"bits":>4}  {"method":<24}{"ms/call":>9}{"peak MB":>9}')
+  for bitdepth in (8, 16, 24, 32):
+    pcm = rng.integers(0, 256, num_frames * args.channels * bitdepth // 8, dtype=np.uint8).tobytes()
+    samples = pcm_to_array(pcm, args.channels, bitdepth)
+    # C-contiguous, and the start of its buffer doubles as the mono output
+    out = np.empty(samples.shape, np.float32)
+    for name, fn in METHODS.items():
+      seconds = min(timeit.repeat(lambda: fn(samples, out), number=1, repeat=args.repeat))
+      peak = _peak_allocation(fn, samples, out)
+      print(f'{bitdepth:>4}  {name:<24}{1000 * seconds:>9.2f}{peak / 1e6:>9.2f}')
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,798 @@
+"""Helpers shared by the instrument emotion dataset builders."""
+
+import bisect
+import collections
+from concurrent import futures
+import dataclasses
+import functools
+import hashlib
+import heapq
+import io
+import json
+import mmap
+import multiprocessing
+import os
+import struct
+import threading
+from typing import Optional
+import weakref
+import zipfile
+
+from absl import logging
+from etils import epath
+import numpy as np
+import tensorflow_datasets as tfds
+from tensorflow_datasets.core.utils.lazy_imports_utils import tensorflow as tf
+
+from . import profiling
+from .audiofeature import AudioFeature, SampleCache, file_digest, frame_windows, scan_wav_headers, spectral_features
+
+# Number of processes used to decode audio while generating examples. Unset or
+# 0 decodes serially in the writing process, a negative value uses all cores.
+ENCODE_WORKERS_ENV = 'INSTRUMENT_EMOTION_ENCODE_WORKERS'
+# Directory to cache encoded audio in across builds, and its size limit in bytes
+CACHE_DIR_ENV = 'INSTRUMENT_EMOTION_CACHE_DIR'
+CACHE_MAX_BYTES_ENV = 'INSTRUMENT_EMOTION_CACHE_MAX_BYTES'
+# Frames per block when encoding audio in bounded memory, unset reads whole files
+BLOCK_FRAMES_ENV = 'INSTRUMENT_EMOTION_BLOCK_FRAMES'
+# Read examples straight from the manual download archive instead of extracting it
+STREAM_ZIP_ENV = 'INSTRUMENT_EMOTION_STREAM_ZIP'
+# Set to 0 to encode every recording, instead of reusing the records of
+# unchanged recordings from an earlier build in the same config directory
+REUSE_PREVIOUS_ENV = 'INSTRUMENT_EMOTION_REUSE_PREVIOUS_BUILD'
+# File to write the time spent in every stage of encoding and writing each
+# example to, as a trace with a summary next to it, see `profiling.export`.
+# Set PROFILE_MEMORY_ENV to 1 to also trace the memory allocated by every
+# stage, which slows encoding down considerably.
+PROFILE_ENV = 'INSTRUMENT_EMOTION_PROFILE'
+PROFILE_MEMORY_ENV = 'INSTRUMENT_EMOTION_PROFILE_MEMORY'
+# Number of recordings read ahead by threads while earlier ones are encoded, 0
+# reads every recording only when it is encoded. Recordings read ahead take up
+# no more than PREFETCH_MAX_BYTES_ENV bytes until encoded, others are read
+# when encoded. Nothing is read ahead when BLOCK_FRAMES_ENV is set.
+PREFETCH_FILES_ENV = 'INSTRUMENT_EMOTION_PREFETCH_FILES'
+PREFETCH_MAX_BYTES_ENV = 'INSTRUMENT_EMOTION_PREFETCH_MAX_BYTES'
+
+# Written next to the dataset files, see `EncodeManifest`
+MANIFEST_NAME = 'encode_manifest.json'
+
+_worker_encode = None
+
+
+@dataclasses.dataclass
+class EmotionRecognitionConfig(tfds.core.BuilderConfig):
+  """BuilderConfig for the emotion recognition datasets.
+
+  Attributes:
+    window_seconds: Cut every recording into windows of this length, each of
+      which becomes an example. Whole recordings are used when `None`.
+    hop_seconds: Time between the starts of consecutive windows, defaults to
+      `window_seconds`.
+    n_mels: Number of mel bands of a log-mel spectrogram stored alongside the
+      audio, none is stored when `None`.
+    n_mfcc: Number of MFCCs computed from the log-mel spectrogram and stored
+      alongside it, none are stored when `None`.
+    frame_seconds: Length of the spectrogram frames.
+    frame_step_seconds: Time between the starts of consecutive spectrogram
+      frames.
+    fmin: Lowest frequency of the mel bands, in Hz.
+    fmax: Highest frequency of the mel bands in Hz, defaults to the Nyquist
+      frequency.
+    storage_format: Compression of the stored audio, 'flac' or `None` for raw
+      samples. Decoding FLAC requires soundfile.
+    balanced_folds: Assign whole performers to the folds such that their total
+      recording durations are balanced, instead of using the file_id ranges
+      of the published folds.
+    lazy_decode: Store the original file data of whole recordings, which is
+      decoded into the audio feature when read, optionally with other options
+      through `LazyAudioDecoder`. Cannot be combined with windows or
+      spectrograms.
+  """
+
+  window_seconds: Optional[float] = None
+  hop_seconds: Optional[float] = None
+  n_mels: Optional[int] = None
+  n_mfcc: Optional[int] = None
+  frame_seconds: float = 0.025
+  frame_step_seconds: float = 0.010
+  fmin: float = 0
+  fmax: Optional[float] = None
+  storage_format: Optional[str] = None
+  balanced_folds: bool = False
+  lazy_decode: bool = False
+
+
+BUILDER_CONFIGS = [
+  EmotionRecognitionConfig(name='full', description='Every example is a whole recording.'),
+  EmotionRecognitionConfig(
+    name='window_3s',
+    description='Every example is a 3 second window of a recording, with 50% overlap between windows.',
+    window_seconds=3,
+    hop_seconds=1.5,
+  ),
+  EmotionRecognitionConfig(
+    name='log_mel',
+    description='Every example is a whole recording, with a 64 band log-mel spectrogram.',
+    n_mels=64,
+  ),
+  EmotionRecognitionConfig(
+    name='window_3s_log_mel',
+    description=(
+      'Every example is a 3 second window of a recording, with 50% overlap between windows, '
+      'with a 64 band log-mel spectrogram and 20 MFCCs.'
+    ),
+    window_seconds=3,
+    hop_seconds=1.5,
+    n_mels=64,
+    n_mfcc=20,
+  ),
+  EmotionRecognitionConfig(
+    name='lazy',
+    description='Every example is a whole recording, stored as its original file data and decoded when read.',
+    lazy_decode=True,
+  ),
+]
+
+
+@functools.lru_cache(maxsize=None)
+def _open_zip(archive):
+  return zipfile.ZipFile(archive)
+
+
+@functools.lru_cache(maxsize=None)
+def _map_zip(archive):
+  with open(archive, 'rb') as f:
+    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class ZipPath:
+  """Path to a file or directory inside a ZIP archive.
+
+  Supports the parts of the `epath.Path` interface the builders use, such that
+  examples can be generated without extracting the archive. `read()` makes
+  it usable as file object for `AudioFeature`, and returns a zero-copy view
+  of the archive for members that are stored uncompressed. Instances only
+  hold names, so they can be sent to worker processes.
+  """
+
+  def __init__(self, archive, name=''):
+    self.archive = os.fspath(archive)
+    self.name = name.strip('/')
+
+  def __truediv__(self, other):
+    return ZipPath(self.archive, f'{self.name}/{other}' if self.name else other)
+
+  def __repr__(self):
+    return f'ZipPath({self.archive!r}, {self.name!r})'
+
+  @property
+  def suffix(self):
+    return os.path.splitext(self.name)[1]
+
+  @property
+  def size(self):
+    return _open_zip(self.archive).getinfo(self.name).file_size
+
+  @property
+  def stored(self):
+    """Whether the member is stored uncompressed, such that `read()` doesn't copy it."""
+    return _open_zip(self.archive).getinfo(self.name).compress_type == zipfile.ZIP_STORED
+
+  def open(self, mode='r'):
+    fobj = _open_zip(self.archive).open(self.name)
+    return fobj if 'b' in mode else io.TextIOWrapper(fobj, encoding='utf-8', newline='')
+
+  def read(self):
+    info = _open_zip(self.archive).getinfo(self.name)
+    if info.compress_type != zipfile.ZIP_STORED:
+      return _open_zip(self.archive).read(self.name)
+    archive = _map_zip(self.archive)
+    # The data follows the local file header, whose extra field can differ from
+    # the one in the central directory
+    signature, *_, name_length, extra_length = struct.unpack_from('<IHHHHHIIIHH', archive, info.header_offset)
+    if signature != 0x04034b50:
+      raise zipfile.BadZipFile(f'Bad local file header for {self.name} in {self.archive}')
+    start = info.header_offset + 30 + name_length + extra_length
+    return memoryview(archive)[start:start + info.file_size]
+
+
+class PrefetchedFile:
+  """Data of a file that was read ahead, standing in for its path.
+
+  Supports the parts of the path interface `AudioFeature` and the encoding
+  helpers use, with `open()` reading from memory. Instances hold the data, so
+  worker processes they are sent to don't read the file again.
+  """
+
+  def __init__(self, path, data):
+    self.path = path
+    self.data = data
+
+  def __repr__(self):
+    return f'PrefetchedFile({self.path!r})'
+
+  @property
+  def name(self):
+    return self.path.name
+
+  @property
+  def suffix(self):
+    return self.path.suffix
+
+  def open(self, mode='rb'):
+    return io.BytesIO(self.data)
+
+
+def manual_data_dir(dl_manager, zip_path, folder):
+  """Returns the directory `folder` of a manually downloaded archive.
+
+  The archive is extracted unless streaming is enabled through
+  `STREAM_ZIP_ENV`.
+  """
+  return manual_data_dirs(dl_manager, {folder: (zip_path, folder)})[folder]
+
+
+def manual_data_dirs(dl_manager, archives):
+  """Returns the directories of several manually downloaded archives, by name.
+
+  Like `manual_data_dir` for a dict from names to `(zip_path, folder)`
+  pairs, extracting the archives concurrently.
+  """
+  if os.environ.get(STREAM_ZIP_ENV):
+    return {name: ZipPath(zip_path, folder) for name, (zip_path, folder) in archives.items()}
+  extracted = dl_manager.extract({name: zip_path for name, (zip_path, _) in archives.items()})
+  return {name: extracted[name] / folder for name, (_, folder) in archives.items()}
+
+
+class AnnotationIndex:
+  """Annotation rows sorted by their integer `file_id`.
+
+  Rows within a range of file ids are looked up by bisection, so serving many
+  ranges doesn't rescan the whole annotation table.
+  """
+
+  def __init__(self, rows):
+    indexed = sorted(((int(row['file_id']), row) for row in rows), key=lambda item: item[0])
+    self._file_ids = [file_id for file_id, _ in indexed]
+    self._rows = [row for _, row in indexed]
+
+  def __len__(self):
+    return len(self._rows)
+
+  def __iter__(self):
+    return zip(self._file_ids, self._rows)
+
+  def between(self, start_id, end_id):
+    """Returns `(file_id, row)` pairs with `start_id <= file_id < end_id`."""
+    start = bisect.bisect_left(self._file_ids, start_id)
+    end = bisect.bisect_left(self._file_ids, end_id, lo=start)
+    return zip(self._file_ids[start:end], self._rows[start:end])
+
+
+def interleave_evenly(sequences) -> list:
+  """Returns the items of `sequences` interleaved in proportion to their lengths.
+
+  Every sequence is spread evenly over the result, so any stretch of it, such
+  as a shard, holds about the same mix of sequences as the whole.
+  """
+  keyed = [
+    ((index + 0.5) / len(sequence), order, item)
+    for order, sequence in enumerate(map(list, sequences))
+    for index, item in enumerate(sequence)
+  ]
+  return [item for *_, item in sorted(keyed, key=lambda key: key[:2])]
+
+
+def wav_durations(paths) -> np.ndarray:
+  """Returns the durations of WAV files in seconds, reading only their headers."""
+  headers = scan_wav_headers(paths)
+  unreadable = np.flatnonzero(headers['num_frames'] < 0)
+  if len(unreadable):
+    raise ValueError(f'Cannot read the duration of {paths[unreadable[0]]}, it is not an integer PCM WAV file.')
+  return headers['num_frames'] / headers['sample_rate']
+
+
+def balance_bins(weights, num_bins):
+  """Returns the bin of every item, balancing the total weight of the bins.
+
+  Items are placed heaviest first in the currently lightest bin (longest
+  processing time first), which is deterministic, with ties broken by order.
+  """
+  bins = [(0, index) for index in range(num_bins)]
+  assignment = [None] * len(weights)
+  for item in sorted(range(len(weights)), key=lambda item: -weights[item]):
+    total, index = heapq.heappop(bins)
+    assignment[item] = index
+    heapq.heappush(bins, (total + weights[item], index))
+  return assignment
+
+
+# Part of the fold assignment cache key, bump whenever the assignment changes
+_FOLD_ASSIGNMENT_VERSION = 1
+
+
+def balanced_folds(examples, num_folds, cache_dir=None, audio_key='audio', group_key='performer'):
+  """Splits `(file_id, example)` pairs into folds of balanced total duration.
+
+  Examples with the same `group_key`, i.e. performer, end up in the same fold.
+  Durations come from the WAV headers. With a `cache_dir`, the assignment is
+  stored there as JSON, keyed by the file ids, groups and file names, such
+  that later builds from the same annotations don't read the headers again.
+  Returns a dict from 'fold1', 'fold2', ... to lists of pairs.
+  """
+  examples = list(examples)
+  key = hashlib.blake2b(digest_size=20)
+  key.update(repr((_FOLD_ASSIGNMENT_VERSION, num_folds)).encode())
+  for file_id, example in examples:
+    key.update(repr((file_id, example[group_key], os.path.basename(example[audio_key].name))).encode())
+  cache_path = None if cache_dir is None else epath.Path(cache_dir) / 'fold_assignments' / f'{key.hexdigest()}.json'
+  if cache_path is not None and cache_path.exists():
+    fold_of = {int(file_id): fold for file_id, fold in json.loads(cache_path.read_text()).items()}
+  else:
+    durations = collections.defaultdict(float)
+    for (_, example), duration in zip(examples, wav_durations([example[audio_key] for _, example in examples])):
+      durations[example[group_key]] += duration
+    if len(durations) < num_folds:
+      raise ValueError(f'Cannot split {len(durations)} {group_key}s into {num_folds} folds.')
+    groups = sorted(durations)
+    group_fold = dict(zip(groups, balance_bins([durations[group] for group in groups], num_folds)))
+    fold_of = {file_id: group_fold[example[group_key]] for file_id, example in examples}
+    if cache_path is not None:
+      cache_path.parent.mkdir(parents=True, exist_ok=True)
+      cache_path.write_text(json.dumps({str(file_id): fold for file_id, fold in sorted(fold_of.items())}))
+  folds = {f'fold{index + 1}': [] for index in range(num_folds)}
+  for file_id, example in examples:
+    folds[f'fold{fold_of[file_id] + 1}'].append((file_id, example))
+  return folds
+
+
+def encode_workers() -> int:
+  workers = int(os.environ.get(ENCODE_WORKERS_ENV) or 0)
+  if workers < 0:
+    return os.cpu_count() or 1
+  return workers
+
+
+def sample_cache():
+  """Returns the `SampleCache` configured through `CACHE_DIR_ENV`, if any."""
+  directory = os.environ.get(CACHE_DIR_ENV)
+  if not directory:
+    return None
+  max_bytes = os.environ.get(CACHE_MAX_BYTES_ENV)
+  return SampleCache(directory, int(max_bytes)) if max_bytes else SampleCache(directory)
+
+
+def block_frames():
+  return int(os.environ.get(BLOCK_FRAMES_ENV) or 0) or None
+
+
+def prefetch_files() -> int:
+  return int(os.environ.get(PREFETCH_FILES_ENV) or 4)
+
+
+def prefetch_max_bytes() -> int:
+  return int(os.environ.get(PREFETCH_MAX_BYTES_ENV) or 256 << 20)
+
+
+class EncodeManifest:
+  """Digests of the recordings in a build, and the settings they were encoded with.
+
+  Saved next to the dataset files, such that later builds can tell which
+  recordings are unchanged.
+  """
+
+  def __init__(self, settings, files=None):
+    self.settings = settings
+    self.files = {} if files is None else files
+
+  @classmethod
+  def load(cls, data_dir):
+    content = json.loads((epath.Path(data_dir) / MANIFEST_NAME).read_text())
+    return cls(content['settings'], {int(file_id): digest for file_id, digest in content['files'].items()})
+
+  def save(self, data_dir):
+    content = {'settings': self.settings, 'files': {str(file_id): digest for file_id, digest in self.files.items()}}
+    (epath.Path(data_dir) / MANIFEST_NAME).write_text(json.dumps(content, indent=1))
+
+
+def encode_settings(audio_feature, config):
+  """Returns a key that changes whenever `config` would encode recordings differently."""
+  base_fields = {field.name for field in dataclasses.fields(tfds.core.BuilderConfig)}
+  fields = {field.name: getattr(config, field.name) for field in dataclasses.fields(config) if field.name not in base_fields}
+  # Reused samples are decoded and stored again, which is only lossless in the same format
+  fields['serialized'] = repr(audio_feature.get_serialized_info())
+  return SampleCache.key(json.dumps(fields, sort_keys=True), **audio_feature.encode_options)
+
+
+def read_tfrecords(path):
+  """Yields the offset and data of every record in a TFRecord file."""
+  with path.open('rb') as f:
+    offset = 0
+    while header := f.read(12):
+      length, = struct.unpack('<Q', header[:8])
+      yield offset + 12, f.read(length)
+      # Skip the data checksum
+      offset = f.seek(4, io.SEEK_CUR)
+
+
+class PreviousBuild:
+  """Records of an earlier build, reused for recordings that haven't changed.
+
+  The records are indexed by `file_id` on first use. Only the features
+  computed from a recording, `part_keys`, are reused, everything else is
+  taken from the current annotations.
+  """
+
+  def __init__(self, directory, manifest, features, part_keys):
+    self._directory = directory
+    self._manifest = manifest
+    self._features = features
+    self._part_keys = part_keys
+    self._index = None
+
+  @classmethod
+  def find(cls, data_dir, settings, features, part_keys):
+    """Returns the newest build next to `data_dir` that used the same settings, if any."""
+    candidates = []
+    for directory in epath.Path(data_dir).parent.iterdir():
+      if directory.name.startswith('incomplete') or not (directory / MANIFEST_NAME).exists():
+        continue
+      try:
+        version = tfds.core.Version(directory.name)
+      except ValueError:
+        continue
+      manifest = EncodeManifest.load(directory)
+      if manifest.settings == settings:
+        candidates.append((version, directory, manifest))
+    if not candidates:
+      return None
+    _, directory, manifest = max(candidates, key=lambda candidate: candidate[0])
+    return cls(directory, manifest, features, part_keys)
+
+  def _build_index(self):
+    index = collections.defaultdict(list)
+    for path in sorted(self._directory.glob('*.tfrecord-*')):
+      for offset, data in read_tfrecords(path):
+        file_id = tf.train.Example.FromString(data).features.feature['file_id'].int64_list.value[0]
+        index[file_id].append((path, offset, len(data)))
+    return index
+
+  def parts(self, file_id, digest):
+    """Returns the features of the examples made from a recording, or `None` if it changed."""
+    if self._manifest.files.get(file_id) != digest:
+      return None
+    if self._index is None:
+      self._index = self._build_index()
+    records = self._index.get(file_id)
+    if not records:
+      return None
+    parts = []
+    for path, offset, length in records:
+      with path.open('rb') as f:
+        f.seek(offset)
+        example = self._features.deserialize_example_np(f.read(length))
+      parts.append({key: example[key] for key in self._part_keys})
+    # Windows are numbered in order of their offset
+    return sorted(parts, key=lambda part: part.get('offset', 0))
+
+
+def reuse_previous_build() -> bool:
+  return os.environ.get(REUSE_PREVIOUS_ENV, '1') != '0'
+
+
+def profile_path() -> Optional[str]:
+  return os.environ.get(PROFILE_ENV) or None
+
+
+def _init_worker(encode, profile=None):
+  global _worker_encode
+  _worker_encode = encode
+  if profile is not None:
+    profiling.enable(**profile)
+
+
+def _encode_in_worker(file_id, path, digest=False):
+  with profiling.example(file_id):
+    digest = _path_digest(path) if digest else None
+    parts = _worker_encode(path)
+  # Profiling events go back with the results, and are empty when disabled
+  return parts, digest, profiling.drain()
+
+
+def _path_digest(path) -> str:
+  with profiling.stage('digest') as stage, (path if hasattr(path, 'open') else epath.Path(path)).open('rb') as f:
+    digest = file_digest(f)
+    if stage is not None:
+      stage.nbytes = f.tell()
+  return digest
+
+
+class RecordingEncoder:
+  """Computes the features of the examples made from a recording.
+
+  Called with the path of a recording, returns one dict of features per
+  window, or a single one for the whole recording. Instances can be sent to
+  worker processes.
+  """
+
+  def __init__(self, encode, window=None, hop=None, spectral=None, audio_key='audio'):
+    self.encode = encode
+    self.window = window
+    self.hop = hop
+    self.spectral = spectral
+    self.audio_key = audio_key
+
+  def __call__(self, path):
+    samples = self.encode(path)
+    if self.window is None:
+      parts = [{self.audio_key: samples}]
+      batch = samples
+    else:
+      offsets, batch = frame_windows(samples, self.window, self.hop)
+      parts = [{self.audio_key: window, 'offset': offset} for offset, window in zip(offsets, batch)]
+    if self.spectral is not None:
+      # Computed for all windows at once
+      with profiling.stage('spectral', batch.nbytes):
+        spectral = self.spectral(batch)
+      for name, values in spectral.items():
+        for part, value in zip(parts, values if self.window is not None else [values]):
+          part[name] = value
+    return parts
+
+
+class _ByteBudget:
+  """Bytes reserved out of `max_bytes`, released from any thread."""
+
+  def __init__(self, max_bytes):
+    self.max_bytes = max_bytes
+    self.reserved = 0
+    self._lock = threading.Lock()
+
+  def reserve(self, nbytes) -> bool:
+    with self._lock:
+      if self.reserved + nbytes > self.max_bytes:
+        return False
+      self.reserved += nbytes
+      return True
+
+  def release(self, nbytes):
+    with self._lock:
+      self.reserved -= nbytes
+
+
+def _prefetch_size(path) -> Optional[int]:
+  """Returns the size of the recording at `path`, None if it isn't worth reading ahead."""
+  if isinstance(path, ZipPath):
+    # Stored members are read as a zero-copy view of the archive when encoded
+    return None if path.stored else path.size
+  return epath.Path(path).stat().length
+
+
+def _read_ahead(file_id, path, budget, size):
+  try:
+    with profiling.example(file_id), profiling.stage('prefetch') as stage:
+      path = path if hasattr(path, 'open') else epath.Path(path)
+      data = path.read() if isinstance(path, ZipPath) else path.read_bytes()
+      if stage is not None:
+        stage.nbytes = len(data)
+  except BaseException:
+    budget.release(size)
+    raise
+  prefetched = PrefetchedFile(path, data)
+  # The size stays reserved as long as the consumer holds on to the data
+  weakref.finalize(prefetched, budget.release, size)
+  return prefetched
+
+
+def prefetch_examples(examples, audio_key='audio', depth=4, max_bytes=256 << 20):
+  """Yields `(file_id, example)` pairs with the recording under `audio_key` read ahead.
+
+  The recordings of up to `depth` examples are read by as many threads while
+  the consumer handles earlier ones, and replaced by a `PrefetchedFile`.
+  Every recording takes up its size out of `max_bytes` from before it is
+  read until the consumer drops its `PrefetchedFile`, so recordings held
+  further on, e.g. queued for encoding, count as well. A recording that
+  doesn't fit waits for earlier ones, and is passed on unread if there are
+  none. Examples keep their order.
+  """
+  if depth <= 0:
+    yield from examples
+    return
+  examples = iter(examples)
+  item = next(examples, None)
+  pending = collections.deque()
+  budget = _ByteBudget(max_bytes)
+  with futures.ThreadPoolExecutor(depth, thread_name_prefix='prefetch') as executor:
+    while item is not None or pending:
+      if item is not None and len(pending) < depth:
+        file_id, example = item
+        size = _prefetch_size(example[audio_key])
+        if size is not None and budget.reserve(size):
+          pending.append((file_id, example, executor.submit(_read_ahead, file_id, example[audio_key], budget, size)))
+          item = next(examples, None)
+          continue
+        if size is None or not pending:
+          # Read when encoded instead
+          pending.append((file_id, example, None))
+          item = next(examples, None)
+          continue
+      file_id, example, read = pending.popleft()
+      if read is not None:
+        example = {**example, audio_key: read.result()}
+      # Only the consumer holds on to the recording, to release it when done
+      del read
+      yield file_id, example
+      del example
+
+
+def encode_examples(examples, encoder, pool=None, max_pending=1, previous=None, digests=None):
+  """Yields the examples made from `(file_id, example)` pairs of recordings.
+
+  The recording under the audio key is encoded with the `RecordingEncoder`,
+  in `pool` if given. Examples keep their order, and no more than
+  `max_pending` recordings are encoded ahead of the consumer, which bounds
+  the memory held in results. Windows become separate examples, keyed
+  '<file_id>_<index>'. Every example gets the `file_id` as feature.
+
+  With a `digests` dict, the digest of every recording is stored in it by
+  `file_id`. It is computed next to the encoding, in `pool` if given, unless
+  needed first to skip encoding the recordings unchanged since the
+  `PreviousBuild`.
+  """
+  def encoded():
+    pending = collections.deque()
+    for file_id, example in examples:
+      path = example[encoder.audio_key]
+      parts = None
+      with profiling.example(file_id):
+        if digests is not None and previous is not None:
+          digests[file_id] = _path_digest(path)
+          with profiling.stage('reuse'):
+            parts = previous.parts(file_id, digests[file_id])
+        if parts is None and pool is None:
+          if digests is not None and file_id not in digests:
+            digests[file_id] = _path_digest(path)
+          parts = encoder(path)
+      if parts is None:
+        parts = pool.submit(_encode_in_worker, file_id, path, digests is not None and file_id not in digests)
+      pending.append((file_id, example, parts))
+      if len(pending) >= max_pending:
+        yield pending.popleft()
+    yield from pending
+
+  for file_id, example, parts in encoded():
+    with profiling.example(file_id):
+      if isinstance(parts, futures.Future):
+        with profiling.stage('wait'):
+          parts, digest, events = parts.result()
+        profiling.merge(events)
+        if digest is not None:
+          digests[file_id] = digest
+      # Times the consumer, i.e. the serialisation and writing of the examples
+      with profiling.stage('write'):
+        if encoder.window is None:
+          yield file_id, {**example, **parts[0], 'file_id': file_id}
+        else:
+          for index, part in enumerate(parts):
+            yield f'{file_id}_{index}', {**example, **part, 'file_id': file_id}
+
+
+def audio_features(config, **audio_kwargs):
+  """Returns the audio features for `config`.
+
+  `audio_kwargs` are passed on to the `AudioFeature`, which is set up to use
+  the cache and block size configured through the environment.
+  """
+  audio_kwargs.update(cache=sample_cache(), block_frames=block_frames(), storage_format=config.storage_format)
+  if config.lazy_decode:
+    if config.window_seconds or config.n_mels:
+      raise ValueError('lazy_decode stores whole recordings, and cannot be combined with window_seconds or n_mels.')
+    # Decoding happens when reading, into the audio as is
+    audio_kwargs.update(lazy_decode=True, storage_dtype=None, storage_format=None)
+  sample_rate = audio_kwargs['force_sample_rate']
+  features = {'file_id': tfds.features.Scalar(np.int64, doc='file_id of the recording in the annotations.')}
+  if not config.window_seconds:
+    features['audio'] = AudioFeature(**audio_kwargs)
+    num_frames = None
+  else:
+    window = round(config.window_seconds * sample_rate)
+    features['audio'] = AudioFeature(shape=(window,), **audio_kwargs)
+    features['offset'] = tfds.features.Scalar(np.int64, doc='Start of the window in the recording, in samples.')
+    frame_length = round(config.frame_seconds * sample_rate)
+    num_frames = 1 + max(0, window - frame_length) // round(config.frame_step_seconds * sample_rate)
+  if config.n_mels:
+    features['log_mel'] = tfds.features.Tensor(
+      shape=(num_frames, config.n_mels), dtype=np.float32, doc='Log-mel spectrogram of the audio.'
+    )
+  if config.n_mfcc:
+    features['mfcc'] = tfds.features.Tensor(
+      shape=(num_frames, config.n_mfcc), dtype=np.float32, doc='MFCCs of the audio.'
+    )
+  return features
+
+
+def encode_splits(splits, features, config, data_dir, audio_key='audio', keep_order=False):
+  """Prepares the split generators of a builder for writing to `data_dir`.
+
+  Recordings are read ahead as configured through `PREFETCH_FILES_ENV`,
+  unless encoded in blocks through `BLOCK_FRAMES_ENV`, and encoded into the
+  features `config` asks for, in a process pool shared by all splits if
+  enabled through `ENCODE_WORKERS_ENV`. Records of unchanged recordings are
+  reused from an earlier build in the same config directory unless disabled
+  through `REUSE_PREVIOUS_ENV`, and otherwise hashed for the manifest of this
+  build. Once every split has been generated, the pool is shut down and the
+  manifest is saved.
+
+  With `keep_order`, examples are keyed by their position in the split, so a
+  builder with shuffling disabled writes them in the order of `splits`.
+  """
+  audio_feature = features[audio_key]
+  sample_rate = audio_feature.sample_rate
+  if not config.window_seconds:
+    encoder = RecordingEncoder(audio_feature.file_encoder(), audio_key=audio_key)
+  else:
+    # Windows are cut from the full length of every recording
+    hop = round((config.hop_seconds or config.window_seconds) * sample_rate)
+    encoder = RecordingEncoder(audio_feature.file_encoder(force_samples=None), audio_feature.shape[0], hop, audio_key=audio_key)
+  if config.n_mels:
+    encoder.spectral = functools.partial(
+      spectral_features,
+      sample_rate=sample_rate,
+      frame_length=round(config.frame_seconds * sample_rate),
+      frame_step=round(config.frame_step_seconds * sample_rate),
+      n_mels=config.n_mels,
+      n_mfcc=config.n_mfcc,
+      fmin=config.fmin,
+      fmax=config.fmax,
+    )
+
+  trace_path = profile_path()
+  if trace_path is not None:
+    profiling.enable(memory=os.environ.get(PROFILE_MEMORY_ENV) == '1')
+
+  manifest = EncodeManifest(encode_settings(audio_feature, config))
+  # File data is cheaper to read again than to reuse, so lazy builds aren't
+  # reused and need no manifest either
+  reuse = reuse_previous_build() and not config.lazy_decode
+  previous = None
+  if reuse:
+    part_keys = [key for key in (audio_key, 'offset', 'log_mel', 'mfcc') if key in features]
+    previous = PreviousBuild.find(data_dir, manifest.settings, features, part_keys)
+
+  # Reading file data as is gains nothing from workers
+  num_workers = 0 if config.lazy_decode else encode_workers()
+  pool = None
+  if num_workers > 0:
+    # TensorFlow is not fork-safe, so workers are started from scratch
+    pool = futures.ProcessPoolExecutor(
+      num_workers,
+      mp_context=multiprocessing.get_context('spawn'),
+      initializer=_init_worker,
+      initargs=(encoder, profiling.settings()),
+    )
+  remaining = set(splits)
+  completed = set()
+
+  def generate(name, examples):
+    try:
+      # Reading whole recordings ahead would defeat the bounded memory of blocks
+      depth = 0 if block_frames() else prefetch_files()
+      examples = prefetch_examples(examples, audio_key, depth, prefetch_max_bytes())
+      encoded = encode_examples(examples, encoder, pool, max(1, 4 * num_workers), previous, manifest.files if reuse else None)
+      if keep_order:
+        # Without shuffling, TFDS still sorts the examples by key
+        encoded = enumerate(example for _, example in encoded)
+      yield from encoded
+      completed.add(name)
+    finally:
+      remaining.discard(name)
+      if not remaining:
+        if pool is not None:
+          pool.shutdown()
+        if reuse and len(completed) == len(splits):
+          manifest.save(data_dir)
+        if trace_path is not None:
+          logging.info('Encoding profile, trace written to %s:\n%s', trace_path, profiling.export(trace_path))
+          profiling.disable()
+
+  return {name: generate(name, examples) for name, examples in splits.items()}
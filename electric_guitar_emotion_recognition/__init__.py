@@ -1,3 +1,6 @@
 """electric_guitar_emotion_recognition dataset."""
 
-from .electric_guitar_emotion_recognition import ElectricGuitarEmotionRecognition
+# Imported as a top-level package by `tfds build` run in this directory, where
+# electric_guitar_emotion_recognition_dataset_builder.py imports the builder instead
+if '.' in __name__:
+  from .electric_guitar_emotion_recognition import ElectricGuitarEmotionRecognition
@@ -0,0 +1,5 @@
+"""Metadata of the datasets, by builder name.
+
+Only plain Python, kept apart from the builder packages, which register their
+builders with TensorFlow Datasets on import.
+"""
@@ -0,0 +1,91 @@
+"""acoustic_guitar_emotion_recognition dataset metadata.
+
+Only plain Python, such that it can be imported without TensorFlow.
+"""
+
+VERSION = '0.6.0'
+
+# Top-level folder of the manual download, which names the archive and annotations
+FOLDER = 'acoustic-guitar'
+
+# Ranges of file_ids, end exclusive, making up the published folds
+FOLDS = {
+  'fold1': [(1, 37), (73, 109), (212, 224)],
+  'fold2': [(37, 49), (121, 133), (200, 212), (272, 296), (392, 404)],
+  'fold3': [(49, 61), (109, 121), (160, 188), (248, 260), (368, 392)],
+  'fold4': [(61, 73), (145, 160), (188, 200), (236, 248), (332, 356)],
+  'fold5': [(133, 145), (260, 272), (296, 332), (356, 368)],
+}
+
+PERFORMERS = [
+  'LucTur',
+  'DavBen',
+  'OweWin',
+  'ValFui',
+  'AdoLaV',
+  'MatRig',
+  'TomCan',
+  'TizCam',
+  'SteRom',
+  'SimArm',
+  'SamLor',
+  'AleMar',
+  'MasChi',
+  'FilMel',
+  'GioAcq',
+  'TizBol',
+  'SalOli',
+  'FedCer',
+  'CesSam',
+  'AntPao',
+  'DavRos',
+  'FraBen',
+  'GiaFer',
+  'GioDic',
+  'NicCon',
+  'AntDel',
+  'NicLat',
+  'LucFra',
+  'AngLoi',
+  'MarPia',
+]
+
+INSTRUMENT_TYPES = [
+  'classical-guitar',
+  'steelstring-guitar',
+]
+
+EMOTIONS = [
+  'aggressive',
+  'relaxed',
+  'happy',
+  'sad',
+]
+
+EMOTIONAL_INTENSITIES = [
+  '1',
+  '2',
+  '3',
+]
+
+PLAYING_TECHNIQUES = [
+    'fingers',
+    'fingers+harmonics',
+    'pick',
+    'pick+fingers',
+    'pick+hammeron',
+    'pick+tapping',
+]
+
+MICROPHONE_TYPES = [
+  'condenser',
+  'condenser+piezo',
+  'piezo',
+  'piezo+external-condenser'
+]
+
+MICROPHONE_POSITIONS = [
+  'external',
+  'internal',
+  'internal+external',
+]
@@ -0,0 +1,66 @@
+"""electric_guitar_emotion_recognition dataset metadata.
+
+Only plain Python, such that it can be imported without TensorFlow.
+"""
+
+VERSION = '0.5.0'
+
+# Top-level folder of the manual download, which names the archive and annotations
+FOLDER = 'electric-guitar'
+
+# Ranges of file_ids, end exclusive, making up the published folds
+FOLDS = {
+  'fold1': [(1, 13), (25, 37), (173, 186), (210, 222), (270, 282), (354, 366)],
+  'fold2': [(13, 25), (73, 97), (137, 149), (186, 198), (246, 258)],
+  'fold3': [(37, 49), (97, 109), (133, 137), (161, 173), (198, 210), (234, 246), (282, 294)],
+  'fold4': [(49, 73), (109, 133), (222, 234), (306, 318), (330, 342)],
+  'fold5': [(149, 161), (258, 270), (294, 306), (318, 330), (342, 354), (366, 378)],
+}
+
+PERFORMERS = [
+  'MatPoz',
+  'GioSca',
+  'ThoBor',
+  'TizBol',
+  'PhiRom',
+  'PaoTad',
+  'AdoLav',
+  'NisSil',
+  'AleMar',
+  'RobBia',
+  'AntPao',
+  'DavBen',
+  'MicRos',
+  'NicSal',
+  'NicCon',
+  'ValFui',
+  'DavAlt',
+  'DavPor',
+  'MarFio',
+  'TomCost',
+  'SalGiu',
+  'SimLuc',
+  'GiuMel',
+  'DieKod',
+  'LucSca',
+  'LucCol',
+  'MarTed',
+  'RicSer',
+]
+
+INSTRUMENT_TYPES = [
+  'electric-guitar',
+]
+
+EMOTIONS = [
+  'aggressive',
+  'relaxed',
+  'happy',
+  'sad',
+]
+
+EMOTIONAL_INTENSITIES = [
+  '1',
+  '2',
+  '3',
+]
@@ -0,0 +1,35 @@
+"""multi_instrument_emotion_recognition dataset metadata.
+
+Only plain Python, such that it can be imported without TensorFlow.
+"""
+
+from itertools import chain
+
+from . import acoustic_guitar_emotion_recognition as acoustic_guitar
+from . import electric_guitar_emotion_recognition as electric_guitar
+from . import piano_emotion_recognition as piano
+
+VERSION = '0.1.0'
+
+# Metadata of the combined datasets, in the order of their file_id ranges
+SOURCES = [piano, electric_guitar, acoustic_guitar]
+
+# The file_id of a recording is its file_id in the annotations of its source,
+# plus this times the index of the source
+FILE_ID_STRIDE = 1000
+
+DATASETS = [source.FOLDER for source in SOURCES]
+
+
+def _union(*vocabularies):
+  return list(dict.fromkeys(chain(*vocabularies)))
+
+
+# Performers who recorded several instruments keep a single id
+PERFORMERS = _union(*(source.PERFORMERS for source in SOURCES))
+
+INSTRUMENT_TYPES = _union(*(source.INSTRUMENT_TYPES for source in SOURCES))
+
+EMOTIONS = _union(*(source.EMOTIONS for source in SOURCES))
+
+EMOTIONAL_INTENSITIES = _union(*(source.EMOTIONAL_INTENSITIES for source in SOURCES))
@@ -0,0 +1,60 @@
+"""piano_emotion_recognition dataset metadata.
+
+Only plain Python, such that it can be imported without TensorFlow.
+"""
+
+VERSION = '0.5.0'
+
+# Top-level folder of the manual download, which names the archive and annotations
+FOLDER = 'piano'
+
+# Ranges of file_ids, end exclusive, making up the published folds
+FOLDS = {
+  'fold1': [(1, 13), (56, 68), (203, 227), (287, 299)],
+  'fold2': [(13, 31), (43, 56), (227, 251)],
+  'fold3': [(31, 43), (86, 100), (131, 155), (191, 203)],
+  'fold4': [(68, 86), (155, 167), (179, 191), (263, 275)],
+  'fold5': [(100, 131), (167, 179), (251, 263), (275, 287)],
+}
+
+PERFORMERS = [
+  'BenGul',
+  'LucTie',
+  'RauMas',
+  'MicCal',
+  'MicBar',
+  'GiaBri',
+  'EdoIso',
+  'FedSpa',
+  'FraPan',
+  'TomMag',
+  'GiuCar',
+  'SavSan',
+  'GiaDiT',
+  'SimCap',
+  'GiaRiz',
+  'ManPie',
+  'SteDam',
+  'LucCen',
+  'EnrBis',
+  'FraOre',
+  'AlbLin',
+  'IlaBro',
+]
+
+INSTRUMENT_TYPES = [
+  'piano',
+]
+
+EMOTIONS = [
+  'aggressive',
+  'relaxed',
+  'happy',
+  'sad',
+]
+
+EMOTIONAL_INTENSITIES = [
+  '1',
+  '2',
+  '3',
+]
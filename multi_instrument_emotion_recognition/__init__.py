@@ -0,0 +1,6 @@
+"""multi_instrument_emotion_recognition dataset."""
+
+# Imported as a top-level package by `tfds build` run in this directory, where
+# multi_instrument_emotion_recognition_dataset_builder.py imports the builder instead
+if '.' in __name__:
+  from .multi_instrument_emotion_recognition import MultiInstrumentEmotionRecognition
@@ -0,0 +1,97 @@
+"""multi_instrument_emotion_recognition dataset."""
+
+import tensorflow_datasets as tfds
+import numpy as np
+import csv
+
+from .. import datasetutils
+from .. import sampling
+from ..metadata import multi_instrument_emotion_recognition as metadata
+from ..metadata.multi_instrument_emotion_recognition import DATASETS, EMOTIONAL_INTENSITIES, EMOTIONS, FILE_ID_STRIDE, INSTRUMENT_TYPES, PERFORMERS, SOURCES
+
+_DESCRIPTION = """
+The piano, electric guitar and acoustic guitar emotion datasets combined,
+with the features they have in common. Performers and instrument types share
+a single vocabulary. Fold k holds fold k of every dataset, and the datasets
+are interleaved evenly within each fold. Examples are written in that order,
+not shuffled, so every shard holds a similar mix of the datasets.
+"""
+
+_CITATION = """
+"""
+
+
+class MultiInstrumentEmotionRecognition(tfds.core.GeneratorBasedBuilder):
+  """DatasetBuilder for multi_instrument_emotion_recognition dataset."""
+
+  VERSION = tfds.core.Version(metadata.VERSION)
+  RELEASE_NOTES = {
+      '0.1.0': 'Initial release, combining piano 0.5.0, electric guitar 0.5.0 and acoustic guitar 0.6.0.',
+  }
+  MANUAL_DOWNLOAD_INSTRUCTIONS = """
+  Dowload the data of the piano, electric guitar and acoustic guitar datasets manually
+  """
+  BUILDER_CONFIGS = datasetutils.BUILDER_CONFIGS
+
+  def _info(self) -> tfds.core.DatasetInfo:
+    """Returns the dataset metadata."""
+    return tfds.core.DatasetInfo(
+        builder=self,
+        description=_DESCRIPTION,
+        features=tfds.features.FeaturesDict({
+            **datasetutils.audio_features(self.builder_config, force_sample_rate=16000, force_channels='mono', dtype=np.float32, normalize=True, storage_dtype=np.int16),
+            'file_id': tfds.features.Scalar(np.int64, doc=f'file_id of the recording in the annotations of its dataset, plus {FILE_ID_STRIDE} times the index of the dataset.'),
+            'dataset': tfds.features.ClassLabel(names=DATASETS, doc='Dataset the recording comes from.'),
+            'performer': tfds.features.ClassLabel(names=PERFORMERS),
+            'instrument_type': tfds.features.ClassLabel(names=INSTRUMENT_TYPES),
+            'emotion': tfds.features.ClassLabel(names=EMOTIONS),
+            'emotional_intensity': tfds.features.ClassLabel(names=EMOTIONAL_INTENSITIES),
+        }),
+        supervised_keys=('audio', 'emotion'),
+        homepage='https://www.cimil.disi.unitn.it/',
+        citation=_CITATION,
+        # Keeps the interleaved order of the datasets, which shuffling by key hash would undo
+        disable_shuffling=True,
+    )
+
+  def _split_generators(self, dl_manager: tfds.download.DownloadManager):
+    """Returns SplitGenerators."""
+    archives = {}
+    for source in SOURCES:
+      zip_path = dl_manager.manual_dir / f'{source.FOLDER}-emotion-dataset-v{source.VERSION}.zip'
+      if not zip_path.exists():
+        raise AssertionError(
+          'Cannot find {}, manual download required'.format(zip_path)
+        )
+      archives[source.FOLDER] = (zip_path, source.FOLDER)
+    base_dirs = datasetutils.manual_data_dirs(dl_manager, archives)
+
+    folds = {}
+    for index, source in enumerate(SOURCES):
+      base_dir = base_dirs[source.FOLDER]
+      with (base_dir / f'annotations_{source.FOLDER}.csv').open() as f:
+        rows = datasetutils.AnnotationIndex(csv.DictReader(f))
+      if self.builder_config.balanced_folds:
+        source_folds = datasetutils.balanced_folds(self._generate_examples(base_dir, rows, index), len(source.FOLDS), dl_manager.download_dir)
+      else:
+        source_folds = {
+          fold: [example for start, end in ranges for example in self._generate_examples(base_dir, rows.between(start, end), index)]
+          for fold, ranges in source.FOLDS.items()
+        }
+      for fold, examples in source_folds.items():
+        folds.setdefault(fold, []).append(examples)
+    # Every shard gets a similar mix of instruments, instead of one after the other,
+    # as the examples are written in this order
+    splits = {fold: datasetutils.interleave_evenly(examples) for fold, examples in folds.items()}
+    return datasetutils.encode_splits(splits, self.info.features, self.builder_config, self.data_dir, keep_order=True)
+
+  def _download_and_prepare(self, dl_manager, download_config):
+    super()._download_and_prepare(dl_manager, download_config)
+    sampling.write_indexes(self.data_dir, self.info)
+
+  def _generate_examples(self, base_dir, metadata_rows, dataset_index):
+    """Yields examples."""
+    for file_id, row in metadata_rows:
+      full_path = base_dir / row['emotion'] / (row['file_name'] + '.wav')
+      example = {'audio': full_path, 'dataset': DATASETS[dataset_index], 'performer': row['performer'], 'instrument_type': row['instrument'], 'emotion': row['emotion'], 'emotional_intensity': row['emotional_intensity']}
+      yield FILE_ID_STRIDE * dataset_index + file_id, example
@@ -0,0 +1,212 @@
+"""Export of built splits to memory-mapped NumPy files, to read them without TensorFlow.
+
+Every split is written to a directory of its own. Features with a fixed
+shape are stacked into one `.npy` file each, with a row per example.
+Features of variable length, such as the audio of whole recordings, are
+concatenated along their first axis into one `.npy` file, next to an int64
+index `<name>.offsets.npy` holding the start of every example followed by the
+total length. ClassLabel ids and other scalars form a table with one `.npy`
+column per feature, and the names of the ClassLabels are kept in
+`features.json`. Loading memory-maps every file, so examples are views into
+the files, read without decoding or copying.
+
+  python -m instrument_emotion_datasets.numpy_export piano_emotion_recognition --config full --output exports
+"""
+
+import argparse
+import importlib
+import json
+import os
+import shutil
+import struct
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+from etils import epath
+
+FEATURES_NAME = 'features.json'
+_NPY_MAGIC = b'\x93NUMPY\x01\x00'
+# Room reserved in the header for the length, which is only known at the end
+_MAX_LENGTH = np.iinfo(np.int64).max
+
+
+def _npy_header(dtype, shape, size=0) -> bytes:
+  """Returns a version 1.0 `.npy` header, padded to a multiple of 64 bytes of at least `size`."""
+  header = repr({'descr': np.lib.format.dtype_to_descr(dtype), 'fortran_order': False, 'shape': shape}).encode('latin1')
+  prefix = len(_NPY_MAGIC) + 2
+  size = max(size, -(-(prefix + len(header) + 1) // 64) * 64)
+  header = header.ljust(size - prefix - 1) + b'\n'
+  return _NPY_MAGIC + struct.pack('<H', len(header)) + header
+
+
+class _ArrayWriter:
+  """Appends arrays along the first axis of a `.npy` file."""
+
+  def __init__(self, path, dtype, shape):
+    self._dtype = np.dtype(dtype)
+    self._shape = tuple(shape)
+    self.length = 0
+    self._file = open(path, 'wb')
+    self._header_size = self._file.write(_npy_header(self._dtype, (_MAX_LENGTH, *self._shape)))
+
+  def append(self, array):
+    array = np.ascontiguousarray(array, self._dtype)
+    if array.shape[1:] != self._shape:
+      raise ValueError(f'Expected arrays of shape (n, *{self._shape}), got {array.shape}.')
+    self._file.write(array.data)
+    self.length += len(array)
+
+  def close(self):
+    self._file.seek(0)
+    self._file.write(_npy_header(self._dtype, (self.length, *self._shape), self._header_size))
+    self._file.close()
+
+
+def _kind(feature) -> str:
+  import tensorflow_datasets as tfds
+
+  if isinstance(feature, tfds.features.ClassLabel) or feature.shape == ():
+    return 'column'
+  if not isinstance(feature, tfds.features.Tensor) or None in feature.shape[1:]:
+    raise ValueError(f'Cannot export {type(feature).__name__} features of shape {feature.shape}.')
+  return 'stacked' if feature.shape[0] is not None else 'concatenated'
+
+
+def export_split(dataset, features, directory, info: Optional[dict] = None) -> int:
+  """Writes the examples of `dataset`, with `features`, to `directory` and returns their number.
+
+  The files are written to a temporary directory next to `directory` first,
+  which replaces it once complete. `info` is added to `features.json`.
+  """
+  import tensorflow_datasets as tfds
+
+  directory = epath.Path(directory)
+  incomplete = directory.with_name(f'incomplete.{directory.name}')
+  shutil.rmtree(incomplete, ignore_errors=True)
+  incomplete.mkdir(parents=True)
+  kinds = {key: _kind(feature) for key, feature in features.items()}
+  columns = {key: [] for key, kind in kinds.items() if kind == 'column'}
+  writers = {
+    key: _ArrayWriter(incomplete / f'{key}.npy', features[key].np_dtype, features[key].shape[kind == 'concatenated':])
+    for key, kind in kinds.items() if kind != 'column'
+  }
+  offsets = {key: [0] for key, kind in kinds.items() if kind == 'concatenated'}
+  num_examples = 0
+  try:
+    for example in tfds.as_numpy(dataset):
+      for key, values in columns.items():
+        values.append(example[key])
+      for key, writer in writers.items():
+        if key in offsets:
+          writer.append(example[key])
+          offsets[key].append(writer.length)
+        else:
+          writer.append(example[key][np.newaxis])
+      num_examples += 1
+  finally:
+    for writer in writers.values():
+      writer.close()
+  for key, values in columns.items():
+    np.save(incomplete / f'{key}.npy', np.array(values, features[key].np_dtype))
+  for key, values in offsets.items():
+    np.save(incomplete / f'{key}.offsets.npy', np.array(values, np.int64))
+  content = {
+    **(info or {}),
+    'num_examples': num_examples,
+    'features': {
+      key: {'kind': kind, **({'names': feature.names} if isinstance(feature, tfds.features.ClassLabel) else {})}
+      for (key, kind), feature in zip(kinds.items(), features.values())
+    },
+  }
+  (incomplete / FEATURES_NAME).write_text(json.dumps(content, indent=2))
+  shutil.rmtree(directory, ignore_errors=True)
+  incomplete.rename(directory)
+  return num_examples
+
+
+def export_builder(builder, directory, splits: Optional[Sequence[str]] = None) -> Dict[str, int]:
+  """Exports the `splits` of a prepared builder, all by default, and returns their numbers of examples.
+
+  Every split goes into `directory/<name>/<config>/<version>/<split>`, like
+  the data directory of the builder.
+  """
+  root = epath.Path(directory) / builder.info.full_name
+  counts = {}
+  for split in splits or sorted(builder.info.splits):
+    info = {'builder': builder.name, 'config': builder.builder_config.name, 'version': str(builder.version), 'split': split}
+    dataset = builder.as_dataset(split=split, shuffle_files=False)
+    counts[split] = export_split(dataset, builder.info.features, root / split, info)
+  return counts
+
+
+class ExportedSplit:
+  """Memory-mapped arrays of a split written by `export_split`.
+
+  Indexing gives an example as a dict of the same features as the dataset,
+  whose arrays are views of the files. `columns` holds the labels and other
+  scalars of all examples, e.g. to select the examples of a class.
+  """
+
+  def __init__(self, directory):
+    directory = epath.Path(directory)
+    self.info = json.loads((directory / FEATURES_NAME).read_text())
+    self.columns = {}
+    self.arrays = {}
+    self.offsets = {}
+    for key, spec in self.info['features'].items():
+      array = np.load(directory / f'{key}.npy', mmap_mode='r')
+      if spec['kind'] == 'column':
+        self.columns[key] = array
+      else:
+        self.arrays[key] = array
+      if spec['kind'] == 'concatenated':
+        self.offsets[key] = np.load(directory / f'{key}.offsets.npy', mmap_mode='r')
+
+  def __len__(self) -> int:
+    return self.info['num_examples']
+
+  def __getitem__(self, index: int) -> dict:
+    if not -len(self) <= index < len(self):
+      raise IndexError(f'Example {index} out of range for {len(self)} examples.')
+    index %= len(self)
+    example = {key: column[index] for key, column in self.columns.items()}
+    for key, array in self.arrays.items():
+      offsets = self.offsets.get(key)
+      example[key] = array[index] if offsets is None else array[offsets[index]:offsets[index + 1]]
+    return example
+
+  def names(self, key: str) -> list:
+    """Returns the names of the ids in ClassLabel column `key`."""
+    return self.info['features'][key]['names']
+
+
+def load_export(directory) -> Dict[str, ExportedSplit]:
+  """Memory-maps every split exported into `directory` by `export_builder`, by name."""
+  return {
+    path.name: ExportedSplit(path)
+    for path in sorted(epath.Path(directory).iterdir())
+    if (path / FEATURES_NAME).exists() and not path.name.startswith('incomplete.')
+  }
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('builder', help='module name of the builder, e.g. piano_emotion_recognition')
+  parser.add_argument('--config', default='full')
+  parser.add_argument('--data-dir', help='where the builder was prepared, TFDS\' default otherwise')
+  parser.add_argument('--splits', nargs='+', help='all splits by default')
+  parser.add_argument('--output', required=True, help='directory to export into')
+  args = parser.parse_args()
+
+  import tensorflow_datasets as tfds
+
+  # Registers the builder
+  importlib.import_module(f'.{args.builder}.{args.builder}', __package__)
+  builder = tfds.builder(f'{args.builder}/{args.config}', data_dir=args.data_dir)
+  for split, count in export_builder(builder, args.output, args.splits).items():
+    print(f'{split}: {count} examples')
+  print(os.fspath(epath.Path(args.output) / builder.info.full_name))
+
+
+if __name__ == '__main__':
+  main()
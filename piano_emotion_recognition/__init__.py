@@ -1,3 +1,6 @@
 """piano_emotion_recognition dataset."""
 
-from .piano_emotion_recognition import PianoEmotionRecognition
+# Imported as a top-level package by `tfds build` run in this directory, where
+# piano_emotion_recognition_dataset_builder.py imports the builder instead
+if '.' in __name__:
+  from .piano_emotion_recognition import PianoEmotionRecognition
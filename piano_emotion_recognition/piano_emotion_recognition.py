@@ -2,13 +2,14 @@
 
 import tensorflow_datasets as tfds
 import numpy as np
-import sys
-from etils import epath
-sys.path.append(str(epath.Path(__file__).parent.parent.resolve()))
-from audiofeature import AudioFeature
 import csv
 from itertools import chain
 
+from .. import datasetutils
+from .. import sampling
+from ..metadata import piano_emotion_recognition as metadata
+from ..metadata.piano_emotion_recognition import EMOTIONAL_INTENSITIES, EMOTIONS, INSTRUMENT_TYPES, PERFORMERS
+
 # TODO(piano_emotion_recognition): Markdown description  that will appear on the catalog page.
 _DESCRIPTION = """
 Description is **formatted** as markdown.
@@ -21,52 +22,11 @@ It should also contain any processing which has been applied (if any),
 _CITATION = """
 """
 
-PERFORMERS = [
-  'BenGul',
-  'LucTie',
-  'RauMas',
-  'MicCal',
-  'MicBar',
-  'GiaBri',
-  'EdoIso',
-  'FedSpa',
-  'FraPan',
-  'TomMag',
-  'GiuCar',
-  'SavSan',
-  'GiaDiT',
-  'SimCap',
-  'GiaRiz',
-  'ManPie',
-  'SteDam',
-  'LucCen',
-  'EnrBis',
-  'FraOre',
-  'AlbLin',
-  'IlaBro',
-]
-
-INSTRUMENT_TYPES = [
-  'piano',
-]
-
-EMOTIONS = [
-  'aggressive',
-  'relaxed',
-  'happy',
-  'sad',
-]
-
-EMOTIONAL_INTENSITIES = [
-  '1',
-  '2',
-  '3',
-]
 
 class PianoEmotionRecognition(tfds.core.GeneratorBasedBuilder):
   """DatasetBuilder for piano_emotion_recognition dataset."""
 
-  VERSION = tfds.core.Version('0.5.0')
+  VERSION = tfds.core.Version(metadata.VERSION)
   RELEASE_NOTES = {
       '0.1.0': 'Initial release.',
       '0.2.0': 'Add three more performers.',
@@ -77,6 +37,7 @@ class PianoEmotionRecognition(tfds.core.GeneratorBasedBuilder):
   MANUAL_DOWNLOAD_INSTRUCTIONS = """
   Dowload data manually
   """
+  BUILDER_CONFIGS = datasetutils.BUILDER_CONFIGS
 
   def _info(self) -> tfds.core.DatasetInfo:
     """Returns the dataset metadata."""
@@ -84,7 +45,7 @@ class PianoEmotionRecognition(tfds.core.GeneratorBasedBuilder):
         builder=self,
         description=_DESCRIPTION,
         features=tfds.features.FeaturesDict({
-            'audio': AudioFeature(force_sample_rate=16000, force_channels='mono', dtype=np.float32, normalize=True),
+            **datasetutils.audio_features(self.builder_config, force_sample_rate=16000, force_channels='mono', dtype=np.float32, normalize=True, storage_dtype=np.int16),
             'performer': tfds.features.ClassLabel(names=PERFORMERS),
             'instrument_type': tfds.features.ClassLabel(names=INSTRUMENT_TYPES),
             'emotion': tfds.features.ClassLabel(names=EMOTIONS),
@@ -99,53 +60,30 @@ class PianoEmotionRecognition(tfds.core.GeneratorBasedBuilder):
     """Returns SplitGenerators."""
     # TODO(piano_emotion_recognition): Downloads the data and defines the splits
     # path = dl_manager.download_and_extract('https://todo-data-url')
-    zip_path = dl_manager.manual_dir / f'piano-emotion-dataset-v{self.VERSION}.zip'
+    zip_path = dl_manager.manual_dir / f'{metadata.FOLDER}-emotion-dataset-v{self.VERSION}.zip'
     if not zip_path.exists():
       raise AssertionError(
         'Cannot find {}, manual download required'.format(zip_path)
       )
-    extract_path = dl_manager.extract(zip_path)
-    base_dir = extract_path / 'piano'
-    with (base_dir / 'annotations_piano.csv').open() as f:
-      rows = [row for row in csv.DictReader(f)]
+    base_dir = datasetutils.manual_data_dir(dl_manager, zip_path, metadata.FOLDER)
+    with (base_dir / f'annotations_{metadata.FOLDER}.csv').open() as f:
+      rows = datasetutils.AnnotationIndex(csv.DictReader(f))
 
-    return {
-      'fold1': chain(
-        self._generate_examples(base_dir, rows, 1, 13),
-        self._generate_examples(base_dir, rows, 56, 68),
-        self._generate_examples(base_dir, rows, 203, 227),
-        self._generate_examples(base_dir, rows, 287, 299),
-      ),
-      'fold2': chain(
-        self._generate_examples(base_dir, rows, 13, 31),
-        self._generate_examples(base_dir, rows, 43, 56),
-        self._generate_examples(base_dir, rows, 227, 251),
-      ),
-      'fold3': chain(
-        self._generate_examples(base_dir, rows, 31, 43),
-        self._generate_examples(base_dir, rows, 86, 100),
-        self._generate_examples(base_dir, rows, 131, 155),
-        self._generate_examples(base_dir, rows, 191, 203),
-      ),
-      'fold4': chain(
-        self._generate_examples(base_dir, rows, 68, 86),
-        self._generate_examples(base_dir, rows, 155, 167),
-        self._generate_examples(base_dir, rows, 179, 191),
-        self._generate_examples(base_dir, rows, 263, 275),
-      ),
-      'fold5': chain(
-        self._generate_examples(base_dir, rows, 100, 131),
-        self._generate_examples(base_dir, rows, 167, 179),
-        self._generate_examples(base_dir, rows, 251, 263),
-        self._generate_examples(base_dir, rows, 275, 287),
-      ),
+    splits = {
+      fold: chain.from_iterable(self._generate_examples(base_dir, rows.between(start, end)) for start, end in ranges)
+      for fold, ranges in metadata.FOLDS.items()
     }
+    if self.builder_config.balanced_folds:
+      splits = datasetutils.balanced_folds(self._generate_examples(base_dir, rows), len(splits), dl_manager.download_dir)
+    return datasetutils.encode_splits(splits, self.info.features, self.builder_config, self.data_dir)
+
+  def _download_and_prepare(self, dl_manager, download_config):
+    super()._download_and_prepare(dl_manager, download_config)
+    sampling.write_indexes(self.data_dir, self.info)
 
-  def _generate_examples(self, base_dir, metadata_rows, start_id, end_id):
+  def _generate_examples(self, base_dir, metadata_rows):
     """Yields examples."""
-    for row in metadata_rows:
-      file_id = int(row['file_id'])
-      if file_id >= start_id and file_id < end_id:
-        full_path = base_dir / row['emotion'] / (row['file_name'] + '.wav')
-        example = {'audio': full_path, 'performer': row['performer'], 'instrument_type': row['instrument'], 'emotion': row['emotion'], 'emotional_intensity': row['emotional_intensity']}
-        yield file_id, example
+    for file_id, row in metadata_rows:
+      full_path = base_dir / row['emotion'] / (row['file_name'] + '.wav')
+      example = {'audio': full_path, 'performer': row['performer'], 'instrument_type': row['instrument'], 'emotion': row['emotion'], 'emotional_intensity': row['emotional_intensity']}
+      yield file_id, example
@@ -0,0 +1,229 @@
+"""Opt-in profiling of the stages that encode and write examples.
+
+Code marks its stages with `stage` and the example it works on with
+`example`. Both return a shared no-op context manager until `enable` is
+called, so leaving them in place costs next to nothing. Once enabled, every
+stage records its wall time and the bytes it processed, and with `memory`
+also the peak memory it allocated, as traced by `tracemalloc`.
+"""
+
+import collections
+import contextlib
+import json
+import os
+import threading
+import time
+import tracemalloc
+from typing import List, NamedTuple, Optional
+
+import numpy as np
+
+_NULL_CONTEXT = contextlib.nullcontext()
+_PERCENTILES = (50, 90, 99)
+
+
+class Event(NamedTuple):
+  stage: str
+  example: Optional[str]
+  start_ns: int
+  duration_ns: int
+  bytes: int
+  allocated: int
+  pid: int
+  thread: int
+
+
+class _Stage:
+  __slots__ = ('_profiler', '_name', 'nbytes', '_start', '_memory', 'peak')
+
+  def __init__(self, profiler, name, nbytes):
+    self._profiler = profiler
+    self._name = name
+    self.nbytes = nbytes
+
+  def __enter__(self):
+    if self._profiler.memory:
+      stack = self._profiler.stack()
+      current, peak = tracemalloc.get_traced_memory()
+      if stack:
+        # Keep the enclosing stage's peak, which resetting would lose
+        stack[-1].peak = max(stack[-1].peak, peak)
+      tracemalloc.reset_peak()
+      self._memory = self.peak = current
+      stack.append(self)
+    self._start = time.perf_counter_ns()
+    return self
+
+  def __exit__(self, *exc_info):
+    duration = time.perf_counter_ns() - self._start
+    allocated = 0
+    if self._profiler.memory:
+      stack = self._profiler.stack()
+      stack.pop()
+      peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+      if stack:
+        stack[-1].peak = max(stack[-1].peak, peak)
+      allocated = peak - self._memory
+    self._profiler.record(self._name, self._start, duration, self.nbytes, allocated)
+
+
+class Profiler:
+  """Collects the stage events of one process."""
+
+  def __init__(self, memory: bool = False):
+    self.memory = memory
+    self.events: List[Event] = []
+    self._pid = os.getpid()
+    self._local = threading.local()
+
+  def stack(self) -> list:
+    if not hasattr(self._local, 'stack'):
+      self._local.stack = []
+    return self._local.stack
+
+  def record(self, name, start, duration, nbytes, allocated):
+    example = getattr(self._local, 'example', None)
+    self.events.append(Event(name, example, start, duration, nbytes, allocated, self._pid, threading.get_ident()))
+
+  @contextlib.contextmanager
+  def example(self, label):
+    previous = getattr(self._local, 'example', None)
+    self._local.example = label
+    try:
+      yield
+    finally:
+      self._local.example = previous
+
+
+_profiler: Optional[Profiler] = None
+
+
+def enable(memory: bool = False) -> None:
+  """Starts profiling in this process, discarding any earlier events."""
+  global _profiler
+  if memory and not tracemalloc.is_tracing():
+    tracemalloc.start()
+  _profiler = Profiler(memory)
+
+
+def disable() -> None:
+  global _profiler
+  if _profiler is not None and _profiler.memory:
+    tracemalloc.stop()
+  _profiler = None
+
+
+def settings() -> Optional[dict]:
+  """Returns the keyword arguments of `enable` to profile other processes the same way, `None` when disabled."""
+  return None if _profiler is None else dict(memory=_profiler.memory)
+
+
+def stage(name: str, nbytes: int = 0):
+  """Returns a context manager timing the stage `name`, which processes `nbytes`.
+
+  Entering it gives `None` when disabled, otherwise an object whose `nbytes`
+  can still be set within the stage.
+  """
+  if _profiler is None:
+    return _NULL_CONTEXT
+  return _Stage(_profiler, name, nbytes)
+
+
+def example(label):
+  """Returns a context manager attributing the stages within to example `label`."""
+  if _profiler is None:
+    return _NULL_CONTEXT
+  return _profiler.example(str(label))
+
+
+def drain() -> List[Event]:
+  """Returns and forgets the events recorded so far, e.g. to send them to another process."""
+  if _profiler is None:
+    return []
+  events, _profiler.events = _profiler.events, []
+  return events
+
+
+def merge(events: List[Event]) -> None:
+  """Adds events recorded by another process."""
+  if _profiler is not None:
+    _profiler.events.extend(Event(*event) for event in events)
+
+
+def summary(events: List[Event]) -> dict:
+  """Aggregates events by stage into the distribution of their time per example.
+
+  Events of the same stage and example are added up first, such that a stage
+  run once per block counts once per example.
+  """
+  per_example = collections.defaultdict(lambda: collections.defaultdict(lambda: [0, 0, 0]))
+  calls = collections.Counter()
+  for event in events:
+    totals = per_example[event.stage][event.example]
+    totals[0] += event.duration_ns
+    totals[1] += event.bytes
+    totals[2] = max(totals[2], event.allocated)
+    calls[event.stage] += 1
+  stages = {}
+  for name, examples in per_example.items():
+    durations, nbytes, allocated = np.array(list(examples.values()), dtype=np.int64).T
+    milliseconds = durations / 1e6
+    # Powers of two of microseconds
+    edges = 2.0 ** np.arange(0, max(1, int(np.ceil(np.log2(max(1, durations.max() / 1e3)))) + 1))
+    counts, _ = np.histogram(np.clip(durations / 1e3, 1, None), edges)
+    stages[name] = {
+      'examples': len(durations),
+      'calls': calls[name],
+      'total_seconds': durations.sum() / 1e9,
+      'bytes': int(nbytes.sum()),
+      'mean_ms': milliseconds.mean(),
+      **{f'p{q}_ms': np.percentile(milliseconds, q) for q in _PERCENTILES},
+      'max_ms': milliseconds.max(),
+      'peak_allocated_bytes': int(allocated.max()),
+      'histogram_us': {'edges': edges.tolist(), 'counts': counts.tolist()},
+    }
+  return stages
+
+
+def format_summary(stages: dict) -> str:
+  """Formats a `summary` as a table, slowest stages first."""
+  columns = ['stage', 'examples', 'calls', 'total s', 'mean ms', *(f'p{q} ms' for q in _PERCENTILES), 'max ms', 'MB/s', 'peak MB']
+  lines = [' '.join(f'{column:>10}' for column in columns)]
+  for name, stats in sorted(stages.items(), key=lambda item: -item[1]['total_seconds']):
+    throughput = stats['bytes'] / stats['total_seconds'] / 1e6 if stats['total_seconds'] else 0
+    values = [
+      stats['examples'], stats['calls'], stats['total_seconds'], stats['mean_ms'],
+      *(stats[f'p{q}_ms'] for q in _PERCENTILES), stats['max_ms'], throughput, stats['peak_allocated_bytes'] / 1e6,
+    ]
+    lines.append(f'{name:>10} ' + ' '.join(f'{value:>10.3f}' if isinstance(value, float) else f'{value:>10}' for value in values))
+  return '\n'.join(lines)
+
+
+def export(path: str) -> str:
+  """Writes the events of this process and the ones merged into it to a trace file.
+
+  The trace at `path` is in Chrome's trace event format, to be viewed in e.g.
+  Perfetto. The `summary` is written next to it with extension
+  `.summary.json`. Returns the summary formatted as a table.
+  """
+  events = _profiler.events if _profiler is not None else []
+  origin = min((event.start_ns for event in events), default=0)
+  trace = [
+    {
+      'name': event.stage,
+      'cat': 'encode',
+      'ph': 'X',
+      'ts': (event.start_ns - origin) / 1e3,
+      'dur': event.duration_ns / 1e3,
+      'pid': event.pid,
+      'tid': event.thread,
+      'args': {'example': event.example, 'bytes': event.bytes, 'allocated': event.allocated},
+    }
+    for event in events
+  ]
+  with open(path, 'w') as f:
+    json.dump({'traceEvents': trace, 'displayTimeUnit': 'ms'}, f)
+  stages = summary(events)
+  with open(os.path.splitext(path)[0] + '.summary.json', 'w') as f:
+    json.dump(stages, f, indent=2)
+  return format_summary(stages)
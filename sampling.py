@@ -0,0 +1,180 @@
+"""Class-balanced sampling of built splits, reading only the records drawn.
+
+Builders write a sampling index for every split, holding the shard, offset
+and length of every record along with the ids of its ClassLabel features.
+`StratifiedSampler` groups the examples into strata of labels with it, and
+draws balanced batches by reading the records at those offsets, no matter how
+imbalanced the split is.
+"""
+
+import functools
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+import tensorflow_datasets as tfds
+from etils import epath
+from tensorflow_datasets.core.utils.lazy_imports_utils import tensorflow as tf
+
+from .datasetutils import read_tfrecords
+
+SAMPLING_INDEX_NAME = 'sampling_index-{split}.npz'
+_LABEL_PREFIX = 'label.'
+
+
+class SamplingIndex:
+  """Where the records of a split are, and their labels, in the order written."""
+
+  def __init__(self, shards, shard, offset, length, labels):
+    self.shards = shards
+    self.shard = shard
+    self.offset = offset
+    self.length = length
+    self.labels = labels
+
+  def __len__(self):
+    return len(self.offset)
+
+  @classmethod
+  def build(cls, paths, label_keys):
+    """Indexes the TFRecord shards at `paths`, reading ClassLabel features `label_keys`."""
+    shard, offset, length = [], [], []
+    labels = {key: [] for key in label_keys}
+    for index, path in enumerate(paths):
+      for record_offset, data in read_tfrecords(path):
+        features = tf.train.Example.FromString(data).features.feature
+        for key, values in labels.items():
+          values.append(features[key].int64_list.value[0])
+        shard.append(index)
+        offset.append(record_offset)
+        length.append(len(data))
+    return cls(
+      [epath.Path(path).name for path in paths],
+      np.array(shard, np.int32),
+      np.array(offset, np.int64),
+      np.array(length, np.int64),
+      {key: np.array(values, np.int64) for key, values in labels.items()},
+    )
+
+  @classmethod
+  def load(cls, data_dir, split):
+    with (epath.Path(data_dir) / SAMPLING_INDEX_NAME.format(split=split)).open('rb') as f:
+      content = np.load(f)
+      labels = {name[len(_LABEL_PREFIX):]: content[name] for name in content.files if name.startswith(_LABEL_PREFIX)}
+      return cls(list(content['shards']), content['shard'], content['offset'], content['length'], labels)
+
+  def save(self, data_dir, split):
+    with (epath.Path(data_dir) / SAMPLING_INDEX_NAME.format(split=split)).open('wb') as f:
+      np.savez(
+        f,
+        shards=np.array(self.shards),
+        shard=self.shard,
+        offset=self.offset,
+        length=self.length,
+        **{_LABEL_PREFIX + key: values for key, values in self.labels.items()},
+      )
+
+
+def write_indexes(data_dir, info):
+  """Writes the `SamplingIndex` of every split of a builder prepared in `data_dir`.
+
+  To be called once the splits are written, i.e. after
+  `GeneratorBasedBuilder._download_and_prepare`. Only TFRecord files are
+  indexed, other formats have random access of their own.
+  """
+  if info.file_format != tfds.core.FileFormat.TFRECORD:
+    return
+  label_keys = [key for key, feature in info.features.items() if isinstance(feature, tfds.features.ClassLabel)]
+  for split, split_info in info.splits.items():
+    paths = [epath.Path(data_dir) / filename for filename in split_info.filenames]
+    SamplingIndex.build(paths, label_keys).save(data_dir, split)
+
+
+class StratifiedSampler:
+  """Draws class-balanced batches from a split of a prepared builder.
+
+  Examples are grouped into strata by their ClassLabel features `keys`, e.g.
+  adding 'performer' to the default emotion and intensity. Draws visit the
+  strata in rounds, each in a new random order, and every stratum hands out
+  its examples in a random order, reshuffled once all were drawn. A batch of
+  at least as many examples as there are strata thus holds every stratum
+  once or twice.
+  """
+
+  def __init__(
+    self,
+    builder,
+    split: str,
+    keys: Sequence[str] = ('emotion', 'emotional_intensity'),
+    seed: Optional[int] = None,
+  ):
+    self._data_dir = epath.Path(builder.data_dir)
+    self._features = builder.info.features
+    self.index = SamplingIndex.load(self._data_dir, split)
+    columns = np.stack([self.index.labels[key] for key in keys], axis=1)
+    ids, inverse = np.unique(columns, axis=0, return_inverse=True)
+    order = np.argsort(inverse.reshape(-1), kind='stable')
+    groups = np.split(order, np.cumsum(np.bincount(inverse.reshape(-1)))[:-1])
+    self.strata: Dict[Tuple[str, ...], np.ndarray] = {
+      tuple(self._features[key].int2str(int(value)) for key, value in zip(keys, row)): positions
+      for row, positions in zip(ids, groups)
+    }
+    self._groups = list(self.strata.values())
+    self._pending = [np.empty(0, np.int64) for _ in self._groups]
+    self._rng = np.random.default_rng(seed)
+
+  def __len__(self):
+    return len(self.index)
+
+  def _draw(self, stratum, count):
+    pending = self._pending[stratum]
+    while len(pending) < count:
+      pending = np.concatenate([pending, self._rng.permutation(self._groups[stratum])])
+    self._pending[stratum] = pending[count:]
+    return pending[:count]
+
+  def positions(self, batch_size: int, num_batches: int) -> np.ndarray:
+    """Returns the positions in the split of the examples of `num_batches` balanced batches."""
+    total = batch_size * num_batches
+    rounds = -(-total // len(self._groups))
+    strata = np.concatenate([self._rng.permutation(len(self._groups)) for _ in range(rounds)])[:total]
+    positions = np.empty(total, np.int64)
+    for stratum in range(len(self._groups)):
+      draws = np.flatnonzero(strata == stratum)
+      positions[draws] = self._draw(stratum, len(draws))
+    return positions.reshape(num_batches, batch_size)
+
+  def records(self, positions):
+    """Yields the serialized examples at `positions`, reading nothing else."""
+    files = {}
+    try:
+      for position in np.asarray(positions).reshape(-1):
+        shard = self.index.shard[position]
+        if shard not in files:
+          files[shard] = (self._data_dir / self.index.shards[shard]).open('rb')
+        files[shard].seek(self.index.offset[position])
+        yield files[shard].read(self.index.length[position])
+    finally:
+      for f in files.values():
+        f.close()
+
+  def as_numpy(self, positions):
+    """Yields the examples at `positions`, decoded with NumPy."""
+    for data in self.records(positions):
+      yield self._features.deserialize_example_np(data)
+
+  def as_dataset(self, batch_size: int, num_batches: Optional[int] = None, decoders=None) -> tf.data.Dataset:
+    """Returns balanced batches as a `tf.data.Dataset`, newly drawn on every iteration.
+
+    One iteration has `num_batches` batches, by default as many as make up
+    the size of the split. Variable length features are padded.
+    """
+    num_batches = num_batches or max(1, len(self) // batch_size)
+    dataset = tf.data.Dataset.from_generator(
+      lambda: self.records(self.positions(batch_size, num_batches)),
+      output_signature=tf.TensorSpec((), tf.string),
+    )
+    dataset = dataset.map(
+      functools.partial(self._features.deserialize_example, decoders=decoders),
+      num_parallel_calls=tf.data.AUTOTUNE,
+    )
+    return dataset.padded_batch(batch_size).prefetch(tf.data.AUTOTUNE)